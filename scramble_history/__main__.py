@@ -8,8 +8,8 @@ import enum
 import dataclasses
 import tempfile
 from pathlib import Path
-from typing import Any
-from collections.abc import Sequence
+from typing import Any, TextIO, TYPE_CHECKING
+from collections.abc import Sequence, Iterable, Callable
 from datetime import datetime
 from decimal import Decimal
 
@@ -21,7 +21,12 @@ from .config import (
     group_args_by_options,
     check_config,
 )
-from .query import parse_query, run_query, Query
+
+# the query/stats modules are only imported by the commands that use them,
+# so commands which don't (e.g. utils) start quickly
+if TYPE_CHECKING:
+    from .query import Query
+    from .group_operations import Summary
 
 
 def _default(o: Any) -> Any:
@@ -29,6 +34,9 @@ def _default(o: Any) -> Any:
     # them as tuples (arrays), since they're technically a subclass
     if isinstance(o, Decimal):
         return str(o)
+    # models which store times in milliseconds, but show them in seconds
+    if hasattr(o, "for_json"):
+        return o.for_json()
     if dataclasses.is_dataclass(o) and not isinstance(o, type):
         return dataclasses.asdict(o)
     if isinstance(o, enum.Enum):
@@ -40,25 +48,67 @@ def _default(o: Any) -> Any:
     raise TypeError(f"Could not serialize object of type {type(o).__name__}")
 
 
-def _serialize(data: Any) -> str:
+def _json_dumps() -> Callable[[Any], bytes]:
+    """
+    returns a function which encodes data as JSON bytes, using orjson if
+    its installed. Used by both the JSON and the NDJSON output
+    """
     try:
         import orjson  # type: ignore[import]
 
-        bdata: bytes = orjson.dumps(
-            data,
-            option=orjson.OPT_NON_STR_KEYS,
-            default=_default,
-        )
-        return bdata.decode("utf-8")
+        def dumps(data: Any) -> bytes:
+            bdata: bytes = orjson.dumps(
+                data,
+                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATACLASS,
+                default=_default,
+            )
+            return bdata
+
+        return dumps
     except ImportError:
         import simplejson  # type: ignore[import]
 
-        return simplejson.dumps(data, default=_default, namedtuple_as_object=True)
+        return lambda data: simplejson.dumps(
+            data, default=_default, namedtuple_as_object=True, for_json=True
+        ).encode("utf-8")
+
+
+def _serialize(data: Any) -> str:
+    return _json_dumps()(data).decode("utf-8")
+
+
+NDJSON_BATCH_SIZE = 1000
+
+
+def _echo_ndjson(records: Iterable[Any], batch_size: int = NDJSON_BATCH_SIZE) -> None:
+    """
+    prints each record as a line of JSON. Records are encoded and flushed in
+    batches as they're consumed, so the output never has to be in memory at once
+    """
+    from more_itertools import chunked
+
+    dumps = _json_dumps()
+    out = sys.stdout.buffer
+    try:
+        for batch in chunked(records, batch_size):
+            out.write(b"".join(dumps(r) + b"\n" for r in batch))
+            out.flush()
+    except BrokenPipeError:
+        # e.g. piped to head, which exited. Point stdout at devnull
+        # so python doesn't error while flushing it at exit
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
 
 
 JSON = click.option(
     "-j", "--json", "_json", is_flag=True, default=False, help="print data as JSON"
 )
+NDJSON = click.option(
+    "--ndjson",
+    is_flag=True,
+    default=False,
+    help="print each solve as a line of JSON, as they're parsed",
+)
 
 
 @click.group(context_settings={"max_content_width": 110})
@@ -98,31 +148,152 @@ def _wca_export() -> None:
     """
 
 
+SIZE_UNITS = ["B", "K", "M", "G", "T"]
+
+
+def _parse_size(
+    ctx: click.Context, param: click.Parameter, value: str | None
+) -> int | None:
+    """parse sizes like 500M or 2G into bytes"""
+    if value is None:
+        return None
+    m = re.fullmatch(r"(\d+)([KMGT]?)", value.strip().upper().removesuffix("B"))
+    if m is None:
+        raise click.BadParameter(f"Could not parse size '{value}', e.g. 500M, 2G")
+    return int(m.group(1)) * int(1024 ** SIZE_UNITS.index(m.group(2) or "B"))
+
+
+def _format_size(size: int) -> str:
+    amount = float(size)
+    for unit in SIZE_UNITS[:-1]:
+        if amount < 1024:
+            return f"{amount:.1f}{unit}"
+        amount /= 1024
+    return f"{amount:.1f}{SIZE_UNITS[-1]}"
+
+
+KEEP = click.option(
+    "-k",
+    "--keep",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of exports to keep  [default: 1]",
+)
+MAX_BYTES = click.option(
+    "-m",
+    "--max-bytes",
+    type=str,
+    default=None,
+    callback=_parse_size,
+    help="Remove old exports until they take up less than this in total, e.g. 2G",
+)
+
+
 @_wca_export.command()
-def update() -> None:
+@KEEP
+@MAX_BYTES
+def update(keep: int | None, max_bytes: int | None) -> None:
     """
     Download/update the local TSV data if its out of date
     """
     from .wca_export import ExportDownloader
 
-    exp = ExportDownloader()
+    exp = ExportDownloader(max_bytes=max_bytes)
+    if keep is not None:
+        exp.keep_snapshots = keep
     exp.download_if_out_of_date()
 
 
+@_wca_export.group(name="cache")
+def _wca_cache() -> None:
+    """
+    Manage the downloaded exports
+    """
+
+
+@_wca_cache.command(name="info")
+def _wca_cache_info() -> None:
+    """
+    Show the downloaded exports, and how much space they use
+    """
+    from tabulate import tabulate
+    from .wca_export import ExportDownloader
+
+    exp = ExportDownloader()
+    click.echo(f"Cache directory: {exp.cache_dir}")
+    click.echo(f"Current export: {exp.current_snapshot() or '--'}")
+    snapshots = exp.snapshots()
+    if snapshots:
+        click.echo(
+            tabulate(
+                [
+                    [s.name, _format_size(s.size), "*" if s.current else ""]
+                    for s in snapshots
+                ],
+                headers=("Export", "Size", "Current"),
+            )
+        )
+    click.echo(f"Total size: {_format_size(exp.cache_size())}")
+
+
+@_wca_cache.command(name="prune")
+@KEEP
+@MAX_BYTES
+def _wca_cache_prune(keep: int | None, max_bytes: int | None) -> None:
+    """
+    Remove old exports
+    """
+    from .wca_export import ExportDownloader
+
+    exp = ExportDownloader()
+    removed = exp.prune(keep_snapshots=keep, max_bytes=max_bytes)
+    click.echo(
+        f"Removed {len(removed)} exports, freed {_format_size(sum(s.size for s in removed))}"
+    )
+
+
 @_wca_export.command()
 @click.option(
-    "-u", "--wca-user-id", type=str, help="WCA ID to extract results for", required=True
+    "-u",
+    "--wca-user-id",
+    "wca_user_ids",
+    type=str,
+    help="WCA ID to extract results for, can be passed multiple times",
+    multiple=True,
+)
+@click.option(
+    "--ids-file",
+    type=click.File("r"),
+    help="File with WCA IDs to extract results for, one per line",
+    default=None,
 )
 @JSON
-def extract(_json: bool, wca_user_id: str) -> None:
+def extract(_json: bool, wca_user_ids: Sequence[str], ids_file: TextIO | None) -> None:
     """
     Extract details from the local TSV data (must call update first)
-    """
-    from .wca_export import parse_return_all_details
 
-    details = parse_return_all_details(wca_user_id)
+    If multiple IDs are given, --json prints one line of JSON for each person
+    """
+    from .wca_export import parse_details
+
+    ids = list(wca_user_ids)
+    if ids_file is not None:
+        ids.extend(line.strip() for line in ids_file if line.strip())
+    if len(ids) == 0:
+        raise click.UsageError("Pass at least one --wca-user-id or an --ids-file")
+
+    all_details = parse_details(ids)
+    details: Any = all_details
+    if len(all_details) == 1:
+        details = next(iter(all_details.values()))
     if _json:
-        click.echo(_serialize(details))
+        if len(all_details) == 1:
+            click.echo(_serialize(details))
+        else:
+            for wca_user_id, person_details in all_details.items():
+                click.echo(
+                    _serialize({"wca_user_id": wca_user_id, "details": person_details})
+                )
     else:
         import IPython  # type: ignore[import]
 
@@ -139,17 +310,23 @@ def parse() -> None:
 
 @parse.command(short_help="parse cstimer.net export file")
 @JSON
+@NDJSON
 @click.argument(
     "CSTIMER_FILE",
     required=True,
     type=click.Path(exists=True, path_type=Path),
 )
-def cstimer(_json: bool, cstimer_file: Path) -> None:
+def cstimer(_json: bool, ndjson: bool, cstimer_file: Path) -> None:
     """
     Expects the cstimer.net export file as input
+
+    --ndjson prints each solve (with the session it's from) instead of each session
     """
-    from .cstimer import parse_file
+    from .cstimer import parse_file, iter_file
 
+    if ndjson:
+        _echo_ndjson(iter_file(cstimer_file))
+        return
     sess = parse_file(cstimer_file)
     if _json:
         click.echo(_serialize(sess))
@@ -167,7 +344,8 @@ def cstimer(_json: bool, cstimer_file: Path) -> None:
     type=click.Path(exists=True, path_type=Path),
 )
 @JSON
-def twistytimer(_json: bool, twistytimer_file: Path) -> None:
+@NDJSON
+def twistytimer(_json: bool, ndjson: bool, twistytimer_file: Path) -> None:
     """
     Expects the twistytimer export file as input
 
@@ -175,6 +353,9 @@ def twistytimer(_json: bool, twistytimer_file: Path) -> None:
     """
     from .twistytimer import parse_file
 
+    if ndjson:
+        _echo_ndjson(parse_file(twistytimer_file))
+        return
     solves = list(parse_file(twistytimer_file))
     if _json:
         click.echo(_serialize(solves))
@@ -202,6 +383,12 @@ config_file = scramble_history_config_dir / conf_name
 def _parse_merge_inputs(
     ctx: click.Context, param: click.Argument, value: Sequence[str]
 ) -> ConfigPaths:
+    # saved so that --watch can re-resolve the inputs
+    ctx.meta["datafile_args"] = list(value)
+    return _resolve_merge_inputs(value)
+
+
+def _resolve_merge_inputs(value: Sequence[str]) -> ConfigPaths:
     conf = {}
     if config_file.exists():
         conf = parse_config_file(config_file)
@@ -225,12 +412,51 @@ def _parse_query(
     ctx: click.Context,
     param: click.Argument,
     value: Sequence[str],
-) -> Query:
+) -> "Query":
+    from .query import parse_query
+
     return parse_query(list(value))
 
 
-def banner() -> None:
-    click.echo("===================")
+BANNER = "==================="
+
+
+def _format_summary(group_name: str, summary: "Summary") -> str:
+    from .group_operations import operation_code
+    from .timeformat import format_decimal
+    from tabulate import tabulate
+
+    desc = "--" if summary.recent_ao5 is None else summary.recent_ao5.describe_average()
+    global_mean = summary.global_mean
+    assert global_mean.solve_count is not None
+    global_mean_desc = operation_code(
+        "global_mean", global_mean.solve_count, len(global_mean.solves)
+    )
+    table = tabulate(
+        [
+            [
+                operation_code("average", count_, count_),
+                "--" if st.current is None else st.current.lhs,
+                "--" if st.best is None else format_decimal(st.best.result),
+            ]
+            for count_, st in summary.stats.items()
+        ],
+        headers=(group_name, "Current", "Best"),
+    )
+    return "\n".join(
+        [
+            BANNER,
+            group_name,
+            BANNER,
+            f"Best => {summary.best.describe()}",
+            f"Worst => {summary.worst.describe()}",
+            f"Most recent Ao5 => {desc}",
+            f"{global_mean_desc} => {format_decimal(global_mean.result)}",
+            f"Solve Count => {summary.solve_count}",
+            "",
+            table,
+        ]
+    )
 
 
 KITTY_PATH = shutil.which("kitty")
@@ -265,10 +491,23 @@ sourcemap_name = "sourcemap.json"
     show_default=True,
     type=click.Path(dir_okay=False, path_type=Path),
 )
+@click.option(
+    "--cache/--no-cache",
+    default=True,
+    show_default=True,
+    help="Cache the merged solves from each file, re-using them if the file is unchanged",
+)
+@click.option(
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of processes to use to parse files",
+)
 @click.option(
     "-a",
     "--action",
-    type=click.Choice(["json", "repl", "stats"]),
+    type=click.Choice(["json", "ndjson", "repl", "stats"]),
     help="what to do with merged solves",
     default="repl",
     show_default=True,
@@ -300,6 +539,24 @@ sourcemap_name = "sourcemap.json"
     ),
     help="graph options",
 )
+@click.option(
+    "-R",
+    "--graph-rolling",
+    default=(),
+    multiple=True,
+    type=str,
+    help="rolling averages to add to graphs, e.g. ao5, ao12, mo3",
+)
+@click.option(
+    "-c",
+    "--stats-count",
+    "stats_counts",
+    default=(5, 12, 50, 100),
+    multiple=True,
+    type=click.IntRange(min=3),
+    show_default=True,
+    help="Averages to compute in the stats table, e.g. -c 5 -c 12 -c 1000",
+)
 @click.option(
     "-q",
     "--query",
@@ -324,6 +581,20 @@ sourcemap_name = "sourcemap.json"
     default=None,
     help="Reverse the sort for --sort-by. Default is --no-reverse, stats uses --reverse",
 )
+@click.option(
+    "-w",
+    "--watch",
+    is_flag=True,
+    default=False,
+    help="With '-a stats', keep running and update the stats when input files change",
+)
+@click.option(
+    "--watch-interval",
+    type=click.FloatRange(min=0.01),
+    default=0.1,
+    show_default=True,
+    help="How often (in seconds) to check if input files have changed",
+)
 @click.argument(
     "DATAFILES",
     type=click.UNPROCESSED,
@@ -332,14 +603,20 @@ sourcemap_name = "sourcemap.json"
 )
 def merge(
     sourcemap_file: Path,
+    cache: bool,
+    jobs: int,
     action: str,
     graph: bool,
     graph_opt: Sequence[str],
+    graph_rolling: Sequence[str],
+    stats_counts: Sequence[int],
     check: bool,
     sort_by: str | None,
     _reverse_flag: bool | None,
-    query: Query | None,
+    query: "Query | None",
     group_by: str | None,
+    watch: bool,
+    watch_interval: float,
     datafiles: dict[str, list[Path]],
 ) -> None:
     """
@@ -352,11 +629,12 @@ def merge(
     --twistytimer ~/Downloads/*twistytimer*.txt
     """
     from .source_merger import merge as merge_solves
+    from .average_parser import parse_operation_code
 
-    solves = list(merge_solves(sourcemap_file=sourcemap_file, conf=datafiles))
-
-    if check:
-        return
+    try:
+        rolling_ops = [parse_operation_code(r) for r in graph_rolling]
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--graph-rolling")
 
     # default to False, unless user provided the flag
     reverse: bool = False
@@ -367,11 +645,52 @@ def merge(
     else:
         reverse = _reverse_flag
 
-    if sort_by == "when":
-        solves.sort(key=lambda s: s.when, reverse=reverse)
+    if watch:
+        if action != "stats" or graph:
+            raise click.BadParameter(
+                "can only be used with '-a stats'", param_hint="--watch"
+            )
+        _watch_stats(
+            sourcemap_file,
+            click.get_current_context().meta["datafile_args"],
+            cache=cache,
+            query=query,
+            group_by=group_by or "event_description",
+            stat_counts=list(stats_counts),
+            interval=watch_interval,
+        )
+        return
+
+    merged = merge_solves(
+        sourcemap_file=sourcemap_file,
+        conf=datafiles,
+        cache=cache,
+        jobs=jobs,
+        sort=sort_by == "when",
+        reverse=reverse,
+    )
+    if action == "ndjson" and not check and group_by is None:
+        from .query import is_lazy, iter_query
+
+        if query is None or is_lazy(query):
+            # nothing else to do with them, so print them as they're merged
+            _echo_ndjson(iter_query(merged, query or []))
+            return
+    solves = list(merged)
+
+    if check:
+        return
+
+    stat_counts = list(stats_counts)
 
     if query:
-        data = run_query(solves, query=query)
+        from .query import run_query, SolveIndex, TimeRange
+
+        # time ranges can be found by binary search on sorted solves
+        index = None
+        if sort_by == "when" and any(isinstance(qr, TimeRange) for qr in query):
+            index = SolveIndex(solves, when_sorted=True)
+        data = run_query(solves, query=query, index=index)
         # if these were not just a Filter and this modified
         # the shape/ran something, we should show that
         if isinstance(data, tuple):
@@ -380,6 +699,7 @@ def merge(
             return
         else:
             # we just filtered, so set the solves to what the query returned
+            assert isinstance(data, list)
             solves = data
 
     if graph and action != "stats":
@@ -408,6 +728,15 @@ def merge(
 
     if action == "json":
         click.echo(_serialize(res))
+    elif action == "ndjson":
+        if isinstance(res, dict):
+            _echo_ndjson(
+                {"group": group, "solve": solve}
+                for group, group_solves in res.items()
+                for solve in group_solves
+            )
+        else:
+            _echo_ndjson(res)
     elif action == "repl":
         import IPython  # type: ignore[import]
 
@@ -415,17 +744,14 @@ def merge(
         IPython.embed(header=header)  # type: ignore[no-untyped-call]
     else:
         from .group_operations import (
-            run_operations,
+            rolling_series,
             grouped,
-            find_best_group,
             operation_code,
-            find_best,
-            find_worst,
+            summarize,
         )
         from .models import State
         from .error import unwrap
         from .timeformat import format_decimal
-        from tabulate import tabulate
 
         # order by number of solves in the group
         by_solve_count = sorted(
@@ -436,57 +762,14 @@ def merge(
         for group_name, _ in by_solve_count:
             group_solves = res[group_name]
             group_solves.sort(key=lambda s: s.when, reverse=reverse)
+            summary = summarize(group_solves, stat_counts)
             # if this has no valid solves, skip it
-            if len(list(filter(lambda s: s.state == State.SOLVED, group_solves))) == 0:
+            if summary is None:
                 continue
-            banner()
-            click.echo(group_name)
-            banner()
-            recent_ao5 = grouped(group_solves, count=5, operation="average")
-            desc = (
-                "--"
-                if isinstance(recent_ao5, Exception)
-                else recent_ao5.describe_average()
-            )
-            best_solve = find_best(group_solves).describe()
-            worst_solve = find_worst(group_solves).describe()
-            global_mean = unwrap(grouped(group_solves, operation="global_mean"))
-            assert global_mean.solve_count is not None
-            global_mean_desc = operation_code(
-                "global_mean", global_mean.solve_count, len(global_mean.solves)
-            )
-            click.echo(f"Best => {best_solve}")
-            click.echo(f"Worst => {worst_solve}")
-            click.echo(f"Most recent Ao5 => {desc}")
-            click.echo(f"{global_mean_desc} => {format_decimal(global_mean.result)}")
-            click.echo(f"Solve Count => {len(group_solves)}")
-            stat_data = run_operations(
-                group_solves, operation="average", counts=[5, 12, 50, 100]
-            )
-            best = find_best_group(
-                group_solves, operation="average", counts=[5, 12, 50, 100]
-            )
-            click.echo()
-            click.echo(
-                tabulate(
-                    [
-                        [
-                            operation_code("average", count_, count_),
-                            stat_data[count_],
-                            (
-                                format_decimal(best[count_].result)
-                                if count_ in best
-                                else "--"
-                            ),
-                        ]
-                        for count_ in stat_data.keys()
-                    ],
-                    headers=(group_name, "Current", "Best"),
-                )
-            )
+            click.echo(_format_summary(group_name, summary))
+            best_solve = summary.best.describe()
+            worst_solve = summary.worst.describe()
             if graph:
-                from dataclasses import asdict
-
                 import matplotlib.pyplot as plt  # type: ignore[import]
                 import seaborn as sns  # type: ignore[import]
                 import pandas as pd  # type: ignore[import]
@@ -505,7 +788,9 @@ def merge(
 
                 pd_input = pd.json_normalize(
                     list(
-                        dict(list(asdict(solve).items()) + list({"solve": i}.items()))
+                        dict(
+                            list(solve.for_json().items()) + list({"solve": i}.items())
+                        )
                         for i, solve in enumerate(group_solves)
                         if solve.state == State.SOLVED
                     )
@@ -522,6 +807,20 @@ def merge(
                     y="full_time",
                     ax=ax,
                 )
+                for op, count_ in rolling_ops:
+                    series = rolling_series(group_solves, op, count_)
+                    # plot each value at the last solve in its window
+                    ends = group_solves[count_ - 1 :]
+                    ax.plot(
+                        [
+                            e.when if "date-axis" in graph_opt else i + count_ - 1
+                            for i, e in enumerate(ends)
+                        ],
+                        [float("nan") if r is None else float(r) for r in series],
+                        label=operation_code(op, count_, count_),
+                    )
+                if rolling_ops:
+                    ax.legend()
                 plt.xlabel("solve date" if "date-axis" in graph_opt else "solve #")
                 plt.ylabel("solve time")
                 ticks, _ = plt.yticks()
@@ -570,5 +869,149 @@ def merge(
                 plt.close()
 
 
+def _watch_stats(
+    sourcemap_file: Path,
+    datafile_args: list[str],
+    *,
+    cache: bool,
+    query: "Query | None",
+    group_by: str,
+    stat_counts: list[int],
+    interval: float,
+) -> None:
+    import time
+    from functools import partial
+    from .query import FilterPart, FILTER_PARTS, _predicate
+    from .watch import WatchedMerge
+
+    filters: list[FilterPart] = []
+    for qr in query or []:
+        if not isinstance(qr, FILTER_PARTS):
+            raise click.BadParameter(
+                f"slicing (drop/limit/head/tail), operations (aoN/moN/rolling) and dump/best can't be used with --watch, found {qr}",
+                param_hint="--query",
+            )
+        filters.append(qr)
+
+    watched = WatchedMerge(
+        sourcemap_file,
+        partial(_resolve_merge_inputs, datafile_args),
+        group_by=group_by,
+        counts=stat_counts,
+        include=_predicate(filters),
+        cache=cache,
+    )
+    # the formatted stats for each group, only updated when a group changes
+    text: dict[str, str] = {}
+
+    def redraw(changed: set[str]) -> None:
+        for group in changed:
+            running = watched.groups.get(group)
+            summary = None if running is None else running.summary()
+            if summary is None:
+                text.pop(group, None)
+            else:
+                text[group] = _format_summary(group, summary)
+        click.clear()
+        by_solve_count = sorted(
+            text, key=lambda g: len(watched.groups[g].solves), reverse=True
+        )
+        click.echo("\n".join(text[g] for g in by_solve_count))
+
+    redraw(watched.update())
+    try:
+        while True:
+            time.sleep(interval)
+            changed = watched.update()
+            if changed:
+                redraw(changed)
+    except KeyboardInterrupt:
+        pass
+
+
+@main.command(
+    context_settings=dict(
+        ignore_unknown_options=True,
+        allow_extra_args=True,
+        max_content_width=110,
+    ),
+    short_help="serve queries against merged solves",
+)
+@click.option(
+    "--sourcemap-file",
+    help="Data file which saves choices on how to map solves from different sources",
+    default=scramble_history_config_dir / sourcemap_name,
+    show_default=True,
+    type=click.Path(dir_okay=False, path_type=Path),
+)
+@click.option(
+    "--cache/--no-cache",
+    default=True,
+    show_default=True,
+    help="Cache the merged solves from each file, re-using them if the file is unchanged",
+)
+@click.option(
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of processes to use to parse files",
+)
+@click.option("--host", default="127.0.0.1", show_default=True, help="host to bind")
+@click.option(
+    "-p", "--port", type=int, default=8555, show_default=True, help="port to bind"
+)
+@click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=None,
+    help="Listen on this unix socket instead of host/port",
+)
+@click.option(
+    "--check-interval",
+    type=click.FloatRange(min=0),
+    default=1.0,
+    show_default=True,
+    help="How often (in seconds) to check if input files have changed",
+)
+@click.argument(
+    "DATAFILES",
+    type=click.UNPROCESSED,
+    callback=_parse_merge_inputs,
+    default=(),
+)
+def serve(
+    sourcemap_file: Path,
+    cache: bool,
+    jobs: int,
+    host: str,
+    port: int,
+    socket_path: Path | None,
+    check_interval: float,
+    datafiles: dict[str, list[Path]],
+) -> None:
+    """
+    merge solves once, and answer queries against them over HTTP
+
+    Takes the same inputs as merge. Input files are checked for
+    changes before each request, and only changed files are re-parsed
+
+    \b
+    GET /query?q=event_code==WCA_333&q=ao5   (the same as merge -q)
+    GET /stats?group_by=event_description&count=5&count=12
+    GET /status
+    GET /reload
+    """
+    from .server import SolveStore, serve as serve_solves
+
+    store = SolveStore(
+        sourcemap_file, datafiles, cache=cache, jobs=jobs, check_interval=check_interval
+    )
+    serve_solves(
+        store, serialize=_serialize, host=host, port=port, socket_path=socket_path
+    )
+
+
 if __name__ == "__main__":
     main(prog_name="scramble_history")
@@ -0,0 +1,204 @@
+"""
+An on-disk cache of the merged (transformed) solves from each input file,
+so unchanged files don't have to be re-parsed/transformed on every merge
+"""
+
+import pickle
+import hashlib
+from pathlib import Path
+from typing import NamedTuple, Any
+
+import platformdirs
+
+from .log import logger
+from .models import Solve, State
+
+# bump this if the format or the parsers change how solves are created
+CACHE_VERSION = 1
+
+STATES: list[State] = list(State)
+
+
+def cachedir() -> Path:
+    return Path(platformdirs.user_cache_dir("scramble_history")) / "merged"
+
+
+def file_hash(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class FileFingerprint(NamedTuple):
+    size: int
+    mtime_ns: int
+    sha256: str
+
+
+def encode_solves(solves: list[Solve]) -> dict[str, Any]:
+    """
+    converts solves to plain python data which pickles compactly: the
+    puzzle/event fields are dictionary-encoded and times are integer milliseconds
+    """
+    strings: dict[str, int] = {}
+    rows = []
+    for s in solves:
+        rows.append(
+            (
+                strings.setdefault(s.puzzle, len(strings)),
+                strings.setdefault(s.event_code, len(strings)),
+                strings.setdefault(s.event_description, len(strings)),
+                STATES.index(s.state),
+                s.scramble,
+                s.comment,
+                s.time_ms,
+                s.penalty_ms,
+                s.full_time_ms,
+                s.when,
+            )
+        )
+    return {"strings": list(strings), "rows": rows}
+
+
+def decode_solves(data: dict[str, Any]) -> list[Solve]:
+    strings: list[str] = data["strings"]
+    return [
+        Solve(
+            puzzle=strings[puzzle],
+            event_code=strings[event_code],
+            event_description=strings[event_description],
+            state=STATES[state],
+            scramble=scramble,
+            comment=comment,
+            time_ms=time,
+            penalty_ms=penalty,
+            full_time_ms=full_time,
+            when=when,
+        )
+        for (
+            puzzle,
+            event_code,
+            event_description,
+            state,
+            scramble,
+            comment,
+            time,
+            penalty,
+            full_time,
+            when,
+        ) in data["rows"]
+    ]
+
+
+class MergeCache:
+    """
+    Each input file gets its own cache entry, which is only used if the
+    file and the sourcemap file are unchanged since it was saved
+
+    A file is unchanged if its size/mtime match, or if those changed
+    but the hash of its contents is the same
+    """
+
+    def __init__(self, sourcemap_file: Path, cache_dir: Path | None = None) -> None:
+        self.sourcemap_file = sourcemap_file
+        self.cache_dir = cache_dir or cachedir()
+        if not self.cache_dir.exists():
+            self.cache_dir.mkdir(parents=True)
+
+    def sourcemap_hash(self) -> str:
+        if not self.sourcemap_file.exists():
+            return ""
+        return file_hash(self.sourcemap_file)
+
+    def _entry_path(self, parser: str, path: Path) -> Path:
+        key = hashlib.sha256(f"{parser}:{path.absolute()}".encode()).hexdigest()
+        return self.cache_dir / f"{key}.pickle"
+
+    def load(self, parser: str, path: Path) -> list[Solve] | None:
+        entry = self._entry_path(parser, path)
+        if not entry.exists():
+            return None
+        try:
+            with entry.open("rb") as f:
+                data = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"Could not read cache entry {entry}, ignoring: {e}")
+            return None
+        if (
+            data.get("version") != CACHE_VERSION
+            or data.get("sourcemap") != self.sourcemap_hash()
+        ):
+            return None
+        fp: FileFingerprint = data["fingerprint"]
+        st = path.stat()
+        if (st.st_size, st.st_mtime_ns) != (fp.size, fp.mtime_ns):
+            if st.st_size != fp.size or file_hash(path) != fp.sha256:
+                return None
+            # contents are the same, so update the mtime to skip hashing next time
+            data["fingerprint"] = fp._replace(mtime_ns=st.st_mtime_ns)
+            self._write(entry, data)
+        logger.debug(f"Using cached solves for {path}")
+        return decode_solves(data["solves"])
+
+    def store(self, parser: str, path: Path, solves: list[Solve]) -> None:
+        st = path.stat()
+        data = {
+            "version": CACHE_VERSION,
+            "path": str(path.absolute()),
+            "sourcemap": self.sourcemap_hash(),
+            "fingerprint": FileFingerprint(
+                size=st.st_size, mtime_ns=st.st_mtime_ns, sha256=file_hash(path)
+            ),
+            "solves": encode_solves(solves),
+        }
+        self._write(self._entry_path(parser, path), data)
+
+    def _write(self, entry: Path, data: dict[str, Any]) -> None:
+        # write to a temporary file first, so a partially written
+        # entry is never read
+        tmp = entry.with_suffix(".tmp")
+        with tmp.open("wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(entry)
+
+
+class MemoryMergeCache(MergeCache):
+    """
+    Also keeps the solves for each file in memory, for long-running
+    processes which merge the same files repeatedly. Entries are used
+    while the size/mtime of the file and the sourcemap are unchanged
+
+    If persist is False, nothing is read from/written to the disk cache
+    """
+
+    def __init__(
+        self, sourcemap_file: Path, cache_dir: Path | None = None, persist: bool = True
+    ) -> None:
+        super().__init__(sourcemap_file, cache_dir)
+        self.persist = persist
+        self.memory: dict[tuple[str, Path], tuple[tuple[int, ...], list[Solve]]] = {}
+
+    def _stamp(self, path: Path) -> tuple[int, ...]:
+        st = path.stat()
+        stamp: tuple[int, ...] = (st.st_size, st.st_mtime_ns)
+        if self.sourcemap_file.exists():
+            sm = self.sourcemap_file.stat()
+            stamp += (sm.st_size, sm.st_mtime_ns)
+        return stamp
+
+    def load(self, parser: str, path: Path) -> list[Solve] | None:
+        stamp = self._stamp(path)
+        hit = self.memory.get((parser, path))
+        if hit is not None and hit[0] == stamp:
+            return hit[1]
+        solves = super().load(parser, path) if self.persist else None
+        if solves is not None:
+            self.memory[(parser, path)] = (stamp, solves)
+        return solves
+
+    def store(self, parser: str, path: Path, solves: list[Solve]) -> None:
+        self.memory[(parser, path)] = (self._stamp(path), solves)
+        if self.persist:
+            super().store(parser, path, solves)
@@ -11,17 +11,29 @@ from more_itertools import unique_everseen
 
 from .log import logger
 from .cstimer_scramble_type import CSTimerScramble, parse_scramble_type
-from .models import State
+from .models import State, from_ms
+from .json_stream import ObjectReader
 
 
 class SessionSolve(NamedTuple):
     scramble: str
     comment: str
-    solve_time: Decimal
-    penalty: Decimal
+    solve_time_ms: int
+    penalty_ms: int
     dnf: bool
     when: datetime
 
+    @property
+    def solve_time(self) -> Decimal:
+        return from_ms(self.solve_time_ms)
+
+    @property
+    def penalty(self) -> Decimal:
+        return from_ms(self.penalty_ms)
+
+    def for_json(self) -> dict[str, Any]:
+        return _for_json(self)
+
 
 class Session(NamedTuple):
     number: int
@@ -39,11 +51,22 @@ class Solve(NamedTuple):
 
     scramble: str
     comment: str
-    solve_time: Decimal
-    penalty: Decimal
+    solve_time_ms: int
+    penalty_ms: int
     dnf: bool
     when: datetime
 
+    @property
+    def solve_time(self) -> Decimal:
+        return from_ms(self.solve_time_ms)
+
+    @property
+    def penalty(self) -> Decimal:
+        return from_ms(self.penalty_ms)
+
+    def for_json(self) -> dict[str, Any]:
+        return _for_json(self)
+
     @property
     def _prompt_defaults(self) -> dict[str, Any]:
         return {
@@ -58,52 +81,93 @@ class Solve(NamedTuple):
             state=State.DNF if self.dnf else State.SOLVED,
             scramble=self.scramble,
             comment=self.comment,
-            time=self.solve_time,
-            penalty=self.penalty,
+            time_ms=self.solve_time_ms,
+            penalty_ms=self.penalty_ms,
+            full_time_ms=self.solve_time_ms + self.penalty_ms,
             when=self.when,
-            full_time=self.solve_time + self.penalty,
         )
 
 
+def _for_json(solve: SessionSolve | Solve) -> dict[str, Any]:
+    # times are in seconds in JSON
+    data: dict[str, Any] = {}
+    for key, val in solve._asdict().items():
+        if key in ("solve_time_ms", "penalty_ms"):
+            key, val = key.removesuffix("_ms"), from_ms(val)
+        data[key] = val
+    return data
+
+
 def parse_file(path: Path) -> list[Session]:
     with path.open("r") as f:
         return _parse_blob(f)
 
 
+def iter_file(path: Path) -> Iterator[Solve]:
+    """
+    streams the solves from an export file, without loading the
+    whole file/every session into memory at once
+    """
+    with path.open("r") as f:
+        sessions = _read_sessions(f)
+        for data_key, solves in _ordered_session_solves(f, sessions):
+            sess = sessions[data_key]
+            for solve in solves:
+                yield _denormalize_solve(sess, solve)
+
+
+def _denormalize_solve(sess: Session, solve: SessionSolve) -> Solve:
+    return Solve(
+        number=sess.number,
+        name=sess.name,
+        raw_scramble_type=sess.raw_scramble_type,
+        scramble_type=sess.scramble_type,
+        scramble=solve.scramble,
+        comment=solve.comment,
+        solve_time_ms=solve.solve_time_ms,
+        penalty_ms=solve.penalty_ms,
+        dnf=solve.dnf,
+        when=solve.when,
+    )
+
+
 def denormalize(sessions: list[Session]) -> Iterator[Solve]:
     for sess in sessions:
         for solve in sess.solves:
-            yield Solve(
-                number=sess.number,
-                name=sess.name,
-                raw_scramble_type=sess.raw_scramble_type,
-                scramble_type=sess.scramble_type,
-                scramble=solve.scramble,
-                comment=solve.comment,
-                solve_time=solve.solve_time,
-                penalty=solve.penalty,
-                dnf=solve.dnf,
-                when=solve.when,
-            )
-
-
-def _parse_blob(f: TextIO) -> list[Session]:
-    data = json.loads(f.read())
-    props: dict[str, Any] = data["properties"]
-    session_raw: str = props["sessionData"]
-    assert isinstance(
-        session_raw, str
-    ), "Fatal error parsing sessions, expected sessionData to be string"
-    session_info = json.loads(session_raw)
-
-    sessions: list[Session] = []
-
-    # parse each session
+            yield _denormalize_solve(sess, solve)
+
+
+def _read_sessions(f: TextIO) -> dict[str, Session]:
+    """
+    reads the session info from the 'properties' key (which is typically
+    at the end of the file), skipping over the solves
+
+    returns sessions with no solves, keyed by the key of their solves in
+    the top-level data, in the order cstimer lists them. Sessions which
+    aren't in the data are ignored
+    """
+    reader = ObjectReader(f)
+    session_info: dict[str, Any] | None = None
+    data_keys: set[str] = set()
+    for key in reader.keys():
+        data_keys.add(key)
+        if key != "properties":
+            continue
+        props: dict[str, Any] = reader.value()
+        session_raw: str = props["sessionData"]
+        assert isinstance(
+            session_raw, str
+        ), "Fatal error parsing sessions, expected sessionData to be string"
+        session_info = json.loads(session_raw)
+    if session_info is None:
+        raise KeyError(f"Could not find 'properties' in cstimer export {f}")
+
+    sessions: dict[str, Session] = {}
     for session_number, session_val in session_info.items():
         # e.g. for session_number '1' -> key in top-level data
         # is "session1"
         data_key = f"session{session_number}"
-        if data_key not in data:
+        if data_key not in data_keys:
             logger.debug(
                 f"Expected session key '{data_key}' in data, ignoring session '{session_val}'"
             )
@@ -114,8 +178,6 @@ def _parse_blob(f: TextIO) -> list[Session]:
         options = session_val.get("opt", {})
         # default to WCA 333 scramble if unset
         scramble_code = options.get("scrType", "333")
-        raw_scrambles = data[data_key]
-        scrambles = map(_parse_scramble, raw_scrambles)
 
         scramble_type: CSTimerScramble | None = None
         try:
@@ -123,19 +185,64 @@ def _parse_blob(f: TextIO) -> list[Session]:
         except KeyError:
             pass
 
-        sessions.append(
-            Session(
-                number=int(session_number),
-                name=session_name,
-                raw_scramble_type=scramble_code,
-                scramble_type=scramble_type,
-                solves=[s for s in scrambles if s is not None],
-            )
+        sessions[data_key] = Session(
+            number=int(session_number),
+            name=session_name,
+            raw_scramble_type=scramble_code,
+            scramble_type=scramble_type,
+            solves=[],
         )
-
     return sessions
 
 
+def _stream_session_solves(
+    f: TextIO, sessions: dict[str, Session]
+) -> Iterator[tuple[str, Iterator[SessionSolve]]]:
+    """
+    yields the key and an iterator of parsed solves for each session in
+    the file, in the order they appear. Each iterator must be consumed
+    before moving on to the next session
+    """
+    f.seek(0)
+    reader = ObjectReader(f)
+    for key in reader.keys():
+        if key not in sessions:
+            continue
+        yield key, (
+            s for s in map(_parse_scramble, reader.array_items()) if s is not None
+        )
+
+
+def _ordered_session_solves(
+    f: TextIO, sessions: dict[str, Session]
+) -> Iterator[tuple[str, Iterator[SessionSolve]]]:
+    """
+    like _stream_session_solves, but in the order cstimer lists the sessions
+    (which decides which duplicate solve is kept when merging). That's usually
+    the order they're in the file, any which are earlier in the file than
+    they should be are kept in memory until it's their turn
+    """
+    order = iter(sessions)
+    expected = next(order, None)
+    early: dict[str, list[SessionSolve]] = {}
+    for key, solves in _stream_session_solves(f, sessions):
+        if key != expected:
+            early[key] = list(solves)
+            continue
+        yield key, solves
+        expected = next(order, None)
+        while expected in early:
+            yield expected, iter(early.pop(expected))
+            expected = next(order, None)
+
+
+def _parse_blob(f: TextIO) -> list[Session]:
+    sessions = _read_sessions(f)
+    for data_key, solves in _ordered_session_solves(f, sessions):
+        sessions[data_key].solves.extend(solves)
+    return list(sessions.values())
+
+
 RawScramble = tuple[tuple[int, int], str, str, int]
 
 
@@ -151,8 +258,8 @@ def _parse_scramble(raw: RawScramble) -> SessionSolve | None:
         return SessionSolve(
             scramble=scramble.strip(),
             comment=comment,
-            solve_time=Decimal(solve_time) / 1000,
-            penalty=Decimal(penalty) / 1000,
+            solve_time_ms=int(solve_time),
+            penalty_ms=int(penalty),
             dnf=is_dnf,
             when=datetime.fromtimestamp(timestamp, tz=timezone.utc),
         )
@@ -163,6 +270,6 @@ def _parse_scramble(raw: RawScramble) -> SessionSolve | None:
 
 def merge_files(paths: list[Path]) -> Iterator[Solve]:
     yield from unique_everseen(
-        chain(*(denormalize(parse_file(p)) for p in paths)),
-        key=lambda s: (s.solve_time + s.penalty, s.when),
+        chain.from_iterable(iter_file(p) for p in paths),
+        key=lambda s: (s.solve_time_ms + s.penalty_ms, s.when),
     )
@@ -1,28 +1,43 @@
 from decimal import Decimal
-from statistics import mean, StatisticsError
-from typing import NamedTuple
-from math import inf
+from typing import NamedTuple, Union, TYPE_CHECKING
 
-from .models import State, Operation, Solve
-from .error import Res
+from .models import State, Operation, Solve, DNF_MS, from_ms
+from .error import Res, unwrap
+from .rolling import best_windows, window_totals, divisor
 from .timeformat import format_decimal
 
+if TYPE_CHECKING:
+    from .solve_table import SolveTable
 
-def solves_to_float(solves_dec: list[Solve]) -> list[float]:
-    return [inf if s.state != State.SOLVED else float(s.full_time) for s in solves_dec]
+# the operations here accept either a list of solves or the columnar SolveTable
+Solves = Union[list[Solve], "SolveTable"]
 
 
-def findminmax(solves: list[Solve] | list[float]) -> tuple[int, int]:
+def _as_list(solves: Solves) -> list[Solve]:
+    return solves if isinstance(solves, list) else solves.to_solves()
+
+
+def solves_to_ms(solves: Solves) -> list[int]:
+    """
+    full times for each solve in milliseconds, DNF_MS for solves which weren't completed
+    """
+    if isinstance(solves, list):
+        return [s.result_ms for s in solves]
+    times: list[int] = solves.times_ms().tolist()
+    return times
+
+
+def findminmax(solves: list[Solve] | list[int]) -> tuple[int, int]:
     """
     returns indexes of min, max
     """
-    solves_enumd: list[tuple[int, float]]
+    solves_ms: list[int]
     if isinstance(solves[0], Solve):
-        solves_enumd = list(enumerate(solves_to_float(solves)))  # type: ignore[arg-type]
+        solves_ms = solves_to_ms(solves)  # type: ignore[arg-type]
     else:
-        solves_enumd = list(enumerate(solves))  # type: ignore[arg-type]
-    min_i = min(solves_enumd, key=lambda s: s[1])[0]
-    max_i = max(solves_enumd, key=lambda s: s[1])[0]
+        solves_ms = solves  # type: ignore[assignment]
+    min_i = min(range(len(solves_ms)), key=solves_ms.__getitem__)
+    max_i = max(range(len(solves_ms)), key=solves_ms.__getitem__)
     return min_i, max_i
 
 
@@ -75,37 +90,41 @@ class Grouping(NamedTuple):
 
 
 def grouped(
-    solves_dc: list[Solve],
+    solves_dc: Solves,
     *,
     operation: Operation,
-    solves_flt: list[float] | None = None,
+    solves_ms: list[int] | None = None,
     count: int | None = None,
 ) -> Res[Grouping]:
     """
     solves should be sorted/ordered prior to doing a grouping
     """
-    if solves_flt is None:
-        solves_flt = solves_to_float(solves_dc)
+    if solves_ms is None:
+        # only convert the solves which could be used
+        if count is not None:
+            solves_dc = solves_dc[:count]
+        solves_ms = solves_to_ms(solves_dc)
+    solves_dc = _as_list(solves_dc)
     # error checking
     if operation == "average" or operation == "mean":
         if count is None:
-            count = len(solves_flt)
+            count = len(solves_ms)
         else:
-            if len(solves_flt) < count:
+            if len(solves_ms) < count:
                 return ValueError(
-                    f"Only have {len(solves_flt)} solves, cannot compute {operation} of {count}"
+                    f"Only have {len(solves_ms)} solves, cannot compute {operation} of {count}"
                 )
     if operation == "average" and (
-        len(solves_flt) < 3 or (count is not None and count < 3)
+        len(solves_ms) < 3 or (count is not None and count < 3)
     ):
         return ValueError("Cannot do operation 'average' with less than 3 solves")
 
     # take first 'count' elements if user passed a larger list
-    if count is not None and len(solves_flt) > count:
-        solves_flt = solves_flt[:count]
+    if count is not None and len(solves_ms) > count:
+        solves_ms = solves_ms[:count]
         solves_dc = solves_dc[:count]
 
-    bad_solves_count = solves_flt.count(inf)
+    bad_solves_count = solves_ms.count(DNF_MS)
 
     # e.g. not set because this is a global mean
     if count is None:
@@ -124,7 +143,7 @@ def grouped(
             return Grouping(
                 solve_count=count,
                 state=State.SOLVED,
-                result=Decimal(mean([s for s in solves_flt if s != inf])),
+                result=from_ms(sum(solves_ms), len(solves_ms)),
                 solves=solves_dc,
                 operation=operation,
             )
@@ -138,30 +157,28 @@ def grouped(
                 solves=solves_dc,
             )
         else:
-            min_i, max_i = findminmax(solves_flt)
+            min_i, max_i = findminmax(solves_ms)
+            counted = [s for i, s in enumerate(solves_ms) if i not in {min_i, max_i}]
             return Grouping(
                 solve_count=count,
                 state=State.SOLVED,
-                result=Decimal(
-                    mean(
-                        [s for i, s in enumerate(solves_flt) if i not in {min_i, max_i}]
-                    )
-                ),
+                result=from_ms(sum(counted), len(counted)),
                 operation=operation,
                 solves=solves_dc,
             )
     elif operation == "global_mean":
-        try:
-            global_mean = mean([s for s in solves_flt if s != inf])
-        except StatisticsError as e:
-            return ValueError(str(e) + " - received no valid solves as input")
+        completed = [s for s in solves_ms if s != DNF_MS]
+        if len(completed) == 0:
+            return ValueError(
+                "mean requires at least one data point - received no valid solves as input"
+            )
 
         return Grouping(
             # dont count DNFs in your global mean 'count'
             solve_count=count - bad_solves_count,
             state=State.SOLVED,
             operation=operation,
-            result=Decimal(global_mean),
+            result=from_ms(sum(completed), len(completed)),
             solves=solves_dc,
         )
     else:
@@ -171,7 +188,7 @@ def grouped(
 
 
 def run_operations(
-    solves: list[Solve], operation: Operation, counts: list[int]
+    solves: Solves, operation: Operation, counts: list[int]
 ) -> dict[int, str]:
     """
     User-facing function to run multiple operations and catch possible errors
@@ -187,55 +204,109 @@ def run_operations(
     return res
 
 
+def rolling_series(
+    solves: Solves, operation: Operation, count: int
+) -> list[Decimal | None]:
+    """
+    computes the result for every window of 'count' solves in one pass
+
+    the value at index i is the result of solves[i:i + count], or None
+    if that window is a DNF. If there are less than 'count' solves,
+    this returns an empty list
+    """
+    div = divisor(operation, count)
+    return [
+        None if total is None else from_ms(total, div)
+        for total in window_totals(solves_to_ms(solves), operation, count)
+    ]
+
+
 def find_best_group(
-    solves: list[Solve], operation: Operation, counts: list[int]
+    solves: Solves, operation: Operation, counts: list[int]
 ) -> dict[int, Grouping]:
-    res: dict[int, Grouping] = {}
-    solves_flt = solves_to_float(solves)
+    return {
+        c: st.best
+        for c, st in batch_stats(solves, operation, counts).items()
+        if st.best is not None
+    }
+
+
+class Stats(NamedTuple):
+    count_: int
+    # the first 'count' solves, None if there aren't enough solves
+    current: Grouping | None
+    # the window of 'count' solves with the best result,
+    # None if there aren't enough solves or every window is a DNF
+    best: Grouping | None
+
+
+def batch_stats(
+    solves: Solves, operation: Operation, counts: list[int]
+) -> dict[int, Stats]:
+    """
+    computes the current and best result for several counts at once,
+    doing a single pass over the solves for all of them
+    """
+    best_starts = best_windows(solves_to_ms(solves), operation, counts)
+    res: dict[int, Stats] = {}
     for c in counts:
-        if len(solves) < c:
-            continue
-        try:
-            groups = list(
-                g
-                for g in (
-                    grouped(
-                        solves_dc=solves[i:],
-                        operation=operation,
-                        solves_flt=solves_flt[i:],
-                        count=c,
-                    )
-                    for i in range(len(solves) - c + 1)
+        current = grouped(solves, operation=operation, count=c)
+        start = best_starts.get(c)
+        res[c] = Stats(
+            count_=c,
+            current=None if isinstance(current, Exception) else current,
+            best=(
+                None
+                if start is None
+                else unwrap(
+                    grouped(solves[start : start + c], operation=operation, count=c)
                 )
-            )
-            res[c] = min(
-                (
-                    g
-                    for g in groups
-                    if not isinstance(g, Exception) and g.state == State.SOLVED
-                ),
-                key=lambda gr: gr.result,
-            )
-        except ValueError as e:
-            raise e
+            ),
+        )
     return res
 
 
-def find_best(solves: list[Solve]) -> Solve:
-    without_dnfs: list[tuple[int, float]] = [
-        tup for tup in enumerate(solves_to_float(solves)) if tup[1] != inf
-    ]
-    if len(without_dnfs) == 0:
+def find_best(solves: Solves) -> Solve:
+    solves_ms = solves_to_ms(solves)
+    if solves_ms.count(DNF_MS) == len(solves_ms):
         raise ValueError("Tried to find best solve on list with no completed solves")
-    min_i = min(without_dnfs, key=lambda o: o[1])[0]
-    return solves[min_i]
+    return solves[min(range(len(solves_ms)), key=solves_ms.__getitem__)]
 
 
-def find_worst(solves: list[Solve]) -> Solve:
-    without_dnfs: list[tuple[int, float]] = [
-        tup for tup in enumerate(solves_to_float(solves)) if tup[1] != inf
-    ]
-    if len(without_dnfs) == 0:
+def find_worst(solves: Solves) -> Solve:
+    solves_ms = solves_to_ms(solves)
+    completed = [i for i, ms in enumerate(solves_ms) if ms != DNF_MS]
+    if len(completed) == 0:
         raise ValueError("Tried to find worst solve list with no completed solves")
-    max_i = max(without_dnfs, key=lambda o: o[1])[0]
-    return solves[max_i]
+    return solves[max(completed, key=solves_ms.__getitem__)]
+
+
+class Summary(NamedTuple):
+    """the stats shown for each group by 'merge -a stats'"""
+
+    solve_count: int
+    best: Solve
+    worst: Solve
+    # None if there are less than 5 solves
+    recent_ao5: Grouping | None
+    global_mean: Grouping
+    stats: dict[int, Stats]
+
+
+def summarize(solves: Solves, counts: list[int]) -> Summary | None:
+    """
+    solves should be sorted most recent first, returns None
+    if there are no completed solves
+    """
+    solves_ms = solves_to_ms(solves)
+    if solves_ms.count(DNF_MS) == len(solves_ms):
+        return None
+    recent_ao5 = grouped(solves, count=5, operation="average")
+    return Summary(
+        solve_count=len(solves),
+        best=find_best(solves),
+        worst=find_worst(solves),
+        recent_ao5=None if isinstance(recent_ao5, Exception) else recent_ao5,
+        global_mean=unwrap(grouped(solves, operation="global_mean")),
+        stats=batch_stats(solves, operation="average", counts=counts),
+    )
@@ -0,0 +1,170 @@
+"""
+A small incremental reader for large JSON files with a top-level object,
+which lets the caller decode values (or items of arrays) one at a time
+instead of loading the whole document into memory
+"""
+
+import re
+import json
+from typing import Any, TextIO
+from collections.abc import Iterator
+
+_decoder = json.JSONDecoder()
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+STRING = r'"[^"\\]*(?:\\.[^"\\]*)*"'
+
+
+def _nested(depth: int) -> str:
+    """
+    a pattern for an array/object, up to 'depth' levels deep. It's only used to
+    find where values end, so anything in between the brackets/strings is allowed
+    """
+    other = r'[^\[\]{}"]*'
+    items = STRING + ("|" + _nested(depth - 1) if depth > 1 else "")
+    inner = f"{other}(?:(?:{items}){other})*"
+    return rf"\[{inner}\]|\{{{inner}\}}"
+
+
+# as many complete (followed by a comma) array items as there are in
+# the buffer, items nested deeper than this are decoded instead
+ARRAY_ITEMS = re.compile(
+    rf'(?:[ \t\n\r]*(?:{STRING}|{_nested(4)}|[^\[\]{{}}",\s]+)[ \t\n\r]*,)*'
+)
+
+
+class ObjectReader:
+    """
+    Reads the keys of a top-level JSON object from a file. After each key
+    is yielded from keys(), call one of value(), array_items() or skip()
+    to consume its value -- if none are called, the value is skipped
+
+    Only one value/array item is decoded at a time, so memory use is bounded
+    by the size of the largest item, not the size of the file
+    """
+
+    def __init__(self, f: TextIO, chunk_size: int = 1 << 16) -> None:
+        self.f = f
+        self.chunk_size = chunk_size
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self._pending = False
+
+    def _fill(self) -> bool:
+        """read more data into the buffer, returns False if at the end of the file"""
+        if self._eof:
+            return False
+        remaining = len(self._buf) - self._pos
+        # read at least as much as is buffered, so values which span
+        # lots of chunks don't get re-decoded once per chunk
+        chunk = self.f.read(max(self.chunk_size, remaining))
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos :] + chunk
+        self._pos = 0
+        return True
+
+    def _peek(self) -> str:
+        """skip whitespace, and return the next character ('' at the end of the file)"""
+        while True:
+            match = WHITESPACE.match(self._buf, self._pos)
+            assert match is not None
+            self._pos = match.end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, char: str) -> None:
+        found = self._peek()
+        if found != char:
+            raise ValueError(
+                f"Expected '{char}' while reading JSON from {self.f}, found '{found}'"
+            )
+        self._pos += 1
+
+    def _decode(self) -> Any:
+        self._peek()
+        while True:
+            try:
+                val, end = _decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                # value is split across chunks, read more and try again
+                if self._fill():
+                    continue
+                raise
+            # a number at the end of the buffer could have more digits (or a
+            # fraction/exponent), values are always followed by one of these
+            after = WHITESPACE.match(self._buf, end)
+            assert after is not None
+            if (
+                after.end() == len(self._buf) or self._buf[after.end()] not in ",:]}"
+            ) and self._fill():
+                continue
+            self._pos = end
+            return val
+
+    def keys(self) -> Iterator[str]:
+        self._expect("{")
+        first = True
+        while True:
+            char = self._peek()
+            if char == "}":
+                self._pos += 1
+                return
+            if not first:
+                self._expect(",")
+            first = False
+            key = self._decode()
+            assert isinstance(key, str), f"Expected object key, found {key}"
+            self._expect(":")
+            self._pending = True
+            yield key
+            if self._pending:
+                self.skip()
+
+    def value(self) -> Any:
+        """decode the value for the current key"""
+        self._pending = False
+        return self._decode()
+
+    def array_items(self) -> Iterator[Any]:
+        """decode each item of the array for the current key, one at a time"""
+        self._pending = False
+        self._expect("[")
+        if self._peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield self._decode()
+            if self._peek() == "]":
+                self._pos += 1
+                return
+            self._expect(",")
+
+    def skip(self) -> None:
+        """
+        skip the value for the current key. Items of arrays are matched with
+        a regex instead of decoded, only the item at the end of each chunk
+        (and the last one) has to be decoded
+        """
+        self._pending = False
+        if self._peek() != "[":
+            self._decode()
+            return
+        self._pos += 1
+        if self._peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            match = ARRAY_ITEMS.match(self._buf, self._pos)
+            assert match is not None
+            self._pos = match.end()
+            self._decode()
+            if self._peek() == "]":
+                self._pos += 1
+                return
+            self._expect(",")
@@ -1,13 +1,30 @@
 from enum import Enum
 from datetime import datetime
 from dataclasses import dataclass
-from typing import Literal
+from typing import Any, Literal
 from decimal import Decimal
 
 from .timeformat import format_decimal
 
 Operation = Literal["average", "mean", "global_mean"]
 
+# used in place of the time for solves that weren't completed,
+# larger than any real time so it sorts after them (and fits in an int64)
+DNF_MS: int = 2**63 - 1
+
+
+def to_ms(d: Decimal) -> int:
+    """convert a time in seconds to integer milliseconds, which it has to be exact to"""
+    ms = d.scaleb(3)
+    if ms != ms.to_integral_value():
+        raise ValueError(f"{d} can't be stored as milliseconds")
+    return int(ms)
+
+
+def from_ms(ms: int, divisor: int = 1) -> Decimal:
+    """convert a (sum of) times in milliseconds back to seconds, dividing by 'divisor'"""
+    return Decimal(ms) / (1000 * divisor)
+
 
 class State(Enum):
     SOLVED = "Solved"
@@ -28,10 +45,10 @@ class Solve:
         "state",
         "scramble",
         "comment",
-        "time",
-        "penalty",
+        "time_ms",
+        "penalty_ms",
+        "full_time_ms",
         "when",
-        "full_time",
     ]
 
     # cstimer: scramble code/manual edit
@@ -53,13 +70,47 @@ class Solve:
     # standard user-facing stuff here
     scramble: str
     comment: str | None
-    time: Decimal
-    penalty: Decimal
+    # times are integer milliseconds, the time/penalty/full_time
+    # properties are the same times in seconds
+    time_ms: int
+    penalty_ms: int
 
     # penalty + time
-    full_time: Decimal
+    full_time_ms: int
     when: datetime
 
+    @property
+    def time(self) -> Decimal:
+        return from_ms(self.time_ms)
+
+    @property
+    def penalty(self) -> Decimal:
+        return from_ms(self.penalty_ms)
+
+    @property
+    def full_time(self) -> Decimal:
+        return from_ms(self.full_time_ms)
+
+    @property
+    def result_ms(self) -> int:
+        """full_time_ms, or DNF_MS if this wasn't solved"""
+        return self.full_time_ms if self.state is State.SOLVED else DNF_MS
+
+    def for_json(self) -> dict[str, Any]:
+        # times are in seconds, like they were before they were stored as milliseconds
+        return {
+            "puzzle": self.puzzle,
+            "event_code": self.event_code,
+            "event_description": self.event_description,
+            "state": self.state,
+            "scramble": self.scramble,
+            "comment": self.comment,
+            "time": self.time,
+            "penalty": self.penalty,
+            "full_time": self.full_time,
+            "when": self.when,
+        }
+
     def describe(self) -> str:
         if self.state == State.SOLVED:
             return format_decimal(self.full_time)
@@ -1,13 +1,23 @@
+import re
 import json
-from typing import Union, NamedTuple, Literal
-
-import more_itertools
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+from datetime import date, datetime, timedelta, timezone
+from itertools import islice, chain, pairwise
+from operator import attrgetter
+from typing import Any, Union, NamedTuple, Literal, TYPE_CHECKING
+from collections.abc import Callable, Iterable, Iterator, Sequence
 
 from .average_parser import parse_operation_code
-from .group_operations import grouped, find_best
+from .group_operations import grouped, find_best, rolling_series, Solves
+from .timeformat import format_decimal
 from .error import unwrap
 from .models import Operation, Solve
 
+if TYPE_CHECKING:
+    from .solve_table import SolveTable
+
 
 class Filter(NamedTuple):
     attr: str
@@ -19,11 +29,22 @@ class FilterIn(NamedTuple):
     values: set[str]
 
 
+class TimeRange(NamedTuple):
+    # solves where start <= when < end, None if unbounded
+    start: datetime | None
+    end: datetime | None
+
+
 class Average(NamedTuple):
     operation: Operation
     count_: int
 
 
+class Rolling(NamedTuple):
+    operation: Operation
+    count_: int
+
+
 class Drop(NamedTuple):
     count_: int
 
@@ -42,13 +63,77 @@ class Tail(NamedTuple):
 
 Commands = Literal["dump", "best"]
 
-QueryPart = Union[Filter, FilterIn, Average, Commands, Drop, Limit, Head, Tail]
+QueryPart = Union[
+    Filter, FilterIn, TimeRange, Average, Rolling, Commands, Drop, Limit, Head, Tail
+]
 
 Query = list[QueryPart]
 
 
+def _operation_count(text: str, count: int) -> int:
+    if count < 1:
+        raise ValueError(f"Query: count should be at least 1 in '{text}'")
+    return count
+
+
 def _parse_colon_cmd(text: str) -> int:
-    return int(text.split(":", maxsplit=1)[-1])
+    count = int(text.split(":", maxsplit=1)[-1])
+    if count < 0:
+        raise ValueError(f"Query: count can't be negative in '{text}'")
+    return count
+
+
+_RELATIVE_UNITS = {
+    "s": "seconds",
+    "m": "minutes",
+    "h": "hours",
+    "d": "days",
+    "w": "weeks",
+}
+
+
+def _parse_when(text: str, *, end: bool = False) -> datetime:
+    """
+    parses an ISO date/datetime (in local time, unless it has an offset) or a
+    relative time like '7d' (7 days ago). A date without a time is the start
+    of that day, or the start of the next day if this is the end of a range,
+    so that the whole day is included
+    """
+    text = text.strip()
+    if m := re.fullmatch(r"(\d+)([smhdw])", text):
+        ago = timedelta(**{_RELATIVE_UNITS[m.group(2)]: int(m.group(1))})
+        return datetime.now(tz=timezone.utc) - ago
+    try:
+        day = date.fromisoformat(text)
+    except ValueError:
+        pass
+    else:
+        dt = datetime(day.year, day.month, day.day)
+        return (dt + timedelta(days=1) if end else dt).astimezone()
+    try:
+        dt = datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(
+            f"Query: could not parse '{text}' as a date, expected an ISO date like '2022-11-03' or a relative time like '7d'"
+        )
+    return dt.astimezone() if dt.tzinfo is None else dt
+
+
+def _parse_time_range(token: str) -> TimeRange:
+    cmd, _, arg = token.partition(":")
+    cmd = cmd.lower()
+    if cmd == "since":
+        return TimeRange(_parse_when(arg), None)
+    elif cmd == "until":
+        return TimeRange(None, _parse_when(arg, end=True))
+    start, sep, end = arg.partition(",")
+    if not sep:
+        raise ValueError(f"Query: expected 'between:start,end', got '{token}'")
+    tr = TimeRange(_parse_when(start), _parse_when(end, end=True))
+    assert tr.start is not None and tr.end is not None
+    if tr.start >= tr.end:
+        raise ValueError(f"Query: start of range is after the end in '{token}'")
+    return tr
 
 
 def parse_query(inputs: str | list[str]) -> Query:
@@ -85,16 +170,22 @@ def parse_query(inputs: str | list[str]) -> Query:
 
         try:
             op, count = parse_operation_code(token)
-            parsed.append(Average(op, count))
-            continue
         except ValueError:
             pass
+        else:
+            parsed.append(Average(op, _operation_count(token, count)))
+            continue
 
         tl = token.lower()
         if tl == "dump":
             parsed.append("dump")
         elif tl == "best":
             parsed.append("best")
+        elif tl.startswith("rolling:"):
+            op, count = parse_operation_code(token.split(":", maxsplit=1)[-1])
+            parsed.append(Rolling(op, _operation_count(token, count)))
+        elif tl.startswith(("since:", "until:", "between:")):
+            parsed.append(_parse_time_range(token))
         elif tl.startswith("drop:"):
             parsed.append(Drop(_parse_colon_cmd(token)))
         elif tl.startswith("limit:"):
@@ -109,41 +200,318 @@ def parse_query(inputs: str | list[str]) -> Query:
     return parsed
 
 
-QueryRet = Union[tuple[str, ...], list[Solve]]
+QueryRet = Union[tuple[str, ...], Solves]
+
+# parts of a query which only filter/slice the solves
+LazyPart = Union[Filter, FilterIn, TimeRange, Drop, Limit, Head, Tail]
+LAZY_PARTS = (Filter, FilterIn, TimeRange, Drop, Limit, Head, Tail)
+
+# parts of a query which only filter solves
+FilterPart = Union[Filter, FilterIn, TimeRange]
+FILTER_PARTS = (Filter, FilterIn, TimeRange)
+
+
+def is_lazy(query: Query) -> bool:
+    """whether this query only filters/slices solves, see iter_query"""
+    return all(isinstance(qr, LAZY_PARTS) for qr in query)
+
+
+def _in_range(ranges: list[TimeRange]) -> Callable[[Any], bool]:
+    starts = [r.start for r in ranges if r.start is not None]
+    ends = [r.end for r in ranges if r.end is not None]
+    start = max(starts) if starts else None
+    end = min(ends) if ends else None
+    if end is None:
+        return lambda solve: bool(start is None or solve.when >= start)
+    if start is None:
+        return lambda solve: bool(solve.when < end)
+    return lambda solve: bool(start <= solve.when < end)
+
+
+def _predicate(parts: Sequence[FilterPart]) -> Callable[[Any], bool]:
+    """combine consecutive filters into one check"""
+    ranges = [f for f in parts if isinstance(f, TimeRange)]
+    filters = [f for f in parts if not isinstance(f, TimeRange)]
+    if ranges:
+        in_range = _in_range(ranges)
+        if not filters:
+            return in_range
+        matches = _predicate(filters)
+        return lambda solve: in_range(solve) and matches(solve)
+
+    if not filters:
+        return lambda solve: True
+    if len(filters) == 1:
+        [f] = filters
+        get = attrgetter(f.attr)
+        if isinstance(f, Filter):
+            value = f.value
+            return lambda solve: bool(get(solve) == value)
+        values = f.values
+        return lambda solve: get(solve) in values
+
+    get_all = attrgetter(*(f.attr for f in filters))
+    checks = [
+        (f.value, False) if isinstance(f, Filter) else (f.values, True) for f in filters
+    ]
+
+    def check(solve: Any) -> bool:
+        for val, (expected, is_in) in zip(get_all(solve), checks):
+            if (val not in expected) if is_in else (val != expected):
+                return False
+        return True
+
+    return check
+
+
+def _filtered(solves: Iterator[Solve], filters: list[FilterPart]) -> Iterator[Solve]:
+    pred = _predicate(filters)
+    first = next(solves, None)
+    if first is None:
+        return
+    for f in filters:
+        if not isinstance(f, TimeRange):
+            assert hasattr(first, f.attr), f"could not find attribute {f} on {first}"
+    if pred(first):
+        yield first
+    yield from filter(pred, solves)
+
+
+def _tail(solves: Iterator[Solve], count: int) -> Iterator[Solve]:
+    yield from deque(solves, maxlen=count)
+
+
+def iter_query(solves: Iterable[Solve], query: Query) -> Iterator[Solve]:
+    """
+    lazily applies a query which only filters/slices solves (see is_lazy)
+    in a single pass over 'solves'. Consecutive filters are checked together,
+    head/limit stop reading from 'solves' once they have enough, and tail
+    only keeps the last 'count' solves in memory
+    """
+    it = iter(solves)
+    filters: list[FilterPart] = []
+    for qr in query:
+        if isinstance(qr, FILTER_PARTS):
+            filters.append(qr)
+            continue
+        if filters:
+            it = _filtered(it, filters)
+            filters = []
+        if isinstance(qr, Drop):
+            it = islice(it, qr.count_, None)
+        elif isinstance(qr, (Limit, Head)):
+            it = islice(it, qr.count_)
+        elif isinstance(qr, Tail):
+            it = _tail(it, qr.count_)
+        else:
+            raise ValueError(
+                f"Cannot run {qr} lazily, only filters/drop/limit/head/tail"
+            )
+    if filters:
+        it = _filtered(it, filters)
+    return it
+
+
+# attributes which SolveIndex indexes, these have few distinct values
+INDEXED_ATTRS = ("puzzle", "event_code", "event_description")
+
+
+class SolveIndex:
+    """
+    Inverted indexes for a list of solves, which map each value of an
+    attribute (see INDEXED_ATTRS) to the sorted positions of the solves
+    which have it. Each attribute is only indexed the first time it's
+    filtered on, so this should be kept and re-used for the same list
+
+    If the solves are sorted by when (either direction), time ranges are
+    found by binary search. Pass when_sorted=True if they're known to be
+    sorted, otherwise that's checked the first time a range is used
+    """
+
+    def __init__(self, solves: list[Solve], *, when_sorted: bool | None = None):
+        self.solves = solves
+        self.when_sorted = when_sorted
+        self._indexes: dict[str, dict[str, "array[int]"]] = {}
+
+    def _index(self, attr: str) -> dict[str, "array[int]"]:
+        index = self._indexes.get(attr)
+        if index is None:
+            index = {}
+            for i, val in enumerate(map(attrgetter(attr), self.solves)):
+                positions = index.get(val)
+                if positions is None:
+                    positions = index[val] = array("l")
+                positions.append(i)
+            self._indexes[attr] = index
+        return index
+
+    def positions(self, attr: str, values: set[str]) -> Sequence[int]:
+        """sorted positions of the solves where 'attr' is one of 'values'"""
+        index = self._index(attr)
+        found = [index[v] for v in values if v in index]
+        if len(found) == 1:
+            return found[0]
+        return sorted(chain.from_iterable(found))
+
+    def _is_sorted(self) -> bool:
+        if self.when_sorted is None:
+            whens = list(map(attrgetter("when"), self.solves))
+            self.when_sorted = all(a <= b for a, b in pairwise(whens)) or all(
+                a >= b for a, b in pairwise(whens)
+            )
+        return self.when_sorted
+
+    def span(self, tr: TimeRange) -> tuple[int, int]:
+        """the positions (start, end) of the solves in the time range"""
+        assert self._is_sorted(), "solves are not sorted by when"
+        solves = self.solves
+        lo, hi = 0, len(solves)
+        if len(solves) == 0:
+            return lo, hi
+        if solves[0].when <= solves[-1].when:
+            key = attrgetter("when")
+            if tr.start is not None:
+                lo = bisect_left(solves, tr.start, key=key)
+            if tr.end is not None:
+                hi = bisect_left(solves, tr.end, key=key)
+        else:
+            # most recent first, so search on the negated timestamps
+            def neg(solve: Solve) -> float:
+                return -solve.when.timestamp()
+
+            if tr.end is not None:
+                lo = bisect_right(solves, -tr.end.timestamp(), key=neg)
+            if tr.start is not None:
+                hi = bisect_right(solves, -tr.start.timestamp(), key=neg)
+        return lo, max(lo, hi)
+
+    def filter(self, query: Query) -> tuple[Iterable[Solve], Query]:
+        """
+        uses the indexes for the filters at the start of the query (if they're
+        on indexed attributes, or are time ranges and the solves are sorted).
+        Returns the solves those select (lazily) and the rest of the query,
+        which starts with any filters which still have to be checked
+        """
+        n = 0
+        while n < len(query) and isinstance(query[n], FILTER_PARTS):
+            n += 1
+        filters: list[FilterPart] = query[:n]  # type: ignore[assignment]
+        ranges = [f for f in filters if isinstance(f, TimeRange)]
+        if ranges and not self._is_sorted():
+            ranges = []
+        # if a range narrows down the solves, checking those is
+        # quicker than building an index which isn't there yet
+        indexed: list[Filter | FilterIn] = [
+            f
+            for f in filters
+            if not isinstance(f, TimeRange)
+            and f.attr in INDEXED_ATTRS
+            and (not ranges or f.attr in self._indexes)
+        ]
+        if not indexed and not ranges:
+            return self.solves, query
+
+        used: list[FilterPart] = list(ranges)
+        lo, hi = 0, len(self.solves)
+        for tr in ranges:
+            start, end = self.span(tr)
+            lo, hi = max(lo, start), min(hi, end)
+        hi = max(lo, hi)
+        if indexed:
+            # only the smallest set of positions is read, the rest of
+            # the filters are checked for each of those solves
+            candidates = []
+            for f in indexed:
+                pos = self.positions(
+                    f.attr, {f.value} if isinstance(f, Filter) else f.values
+                )
+                # positions are sorted, so the range is a slice of them
+                candidates.append((pos, bisect_left(pos, lo), bisect_left(pos, hi), f))
+            pos, start, end, f = min(candidates, key=lambda c: c[2] - c[1])
+            used.append(f)
+            selected = pos[start:end]
+        else:
+            selected = range(lo, hi)
+        rest: Query = [f for f in filters if not any(f is u for u in used)]
+        return map(self.solves.__getitem__, selected), rest + query[n:]
+
+
+def _run_command(solves: Solves, qr: QueryPart) -> str:
+    if isinstance(qr, Average):
+        g = unwrap(grouped(solves, operation=qr.operation, count=qr.count_))
+        return g.describe()
+    elif isinstance(qr, Rolling):
+        return "\n".join(
+            "DNF" if r is None else format_decimal(r)
+            for r in rolling_series(solves, qr.operation, qr.count_)
+        )
+    elif qr == "best":
+        return find_best(solves).describe()
+    else:
+        assert qr == "dump", str(qr)
+        return "\n".join([s.describe() for s in solves])
 
 
-def run_query(solves: list[Solve], *, query: Query) -> QueryRet:
+def _run_table_query(solves: "SolveTable", query: Query) -> QueryRet:
+    # filters are done with vectorized masks on the columns
     returns: list[str] = []
     for qr in query:
-        if isinstance(qr, (Filter, FilterIn)):
+        if isinstance(qr, TimeRange):
+            solves = solves[solves.when_mask(qr.start, qr.end)]
+        elif isinstance(qr, (Filter, FilterIn)):
             if len(solves) == 0:
                 continue
-            assert hasattr(
-                solves[0], qr.attr
-            ), f"could not find attribute {qr} on {solves[0]}"
-            if isinstance(qr, Filter):
-                solves = list(filter(lambda solv: getattr(solv, qr.attr) == qr.value, solves))  # type: ignore[arg-type]
-            else:
-                solves = list(filter(lambda solv: getattr(solv, qr.attr) in qr.values, solves))  # type: ignore[arg-type]
-        elif isinstance(qr, Average):
-            g = unwrap(grouped(solves, operation=qr.operation, count=qr.count_))
-            returns.append(g.describe())
+            values = {qr.value} if isinstance(qr, Filter) else qr.values
+            solves = solves[solves.mask(qr.attr, values)]
         elif isinstance(qr, Drop):
             solves = solves[qr.count_ :]
-        elif isinstance(qr, Limit):
+        elif isinstance(qr, (Limit, Head)):
             solves = solves[: qr.count_]
-        elif isinstance(qr, Head):
-            solves = more_itertools.take(qr.count_, solves)
         elif isinstance(qr, Tail):
-            solves = list(more_itertools.tail(qr.count_, solves))
+            solves = solves[max(len(solves) - qr.count_, 0) :]
         else:
-            if qr == "best":
-                returns.append(find_best(solves).describe())
-            else:
-                assert qr == "dump", str(qr)
-                returns.append("\n".join([s.describe() for s in solves]))
+            returns.append(_run_command(solves, qr))
 
     if len(returns) == 0:
         return solves
 
     return tuple(returns)
+
+
+def run_query(
+    solves: Solves, *, query: Query, index: SolveIndex | None = None
+) -> QueryRet:
+    """
+    solves can either be a list of solves or a SolveTable, in which
+    case filters are done with vectorized masks on the columns
+
+    for lists, the filters/slices between each command are run
+    lazily (see iter_query), so only the solves which are needed are read.
+    If an index for the list is passed, it's used for the filters at the
+    start of the query
+    """
+    if not isinstance(solves, list):
+        return _run_table_query(solves, query)
+
+    selected: Iterable[Solve] = solves
+    if index is not None:
+        assert index.solves is solves, "index is for a different list of solves"
+        selected, query = index.filter(query)
+
+    returns: list[str] = []
+    pending: Query = []
+    for qr in query:
+        if isinstance(qr, LAZY_PARTS):
+            pending.append(qr)
+            continue
+        if pending or selected is not solves:
+            solves = list(iter_query(selected, pending))
+            selected = solves
+            pending = []
+        returns.append(_run_command(solves, qr))
+
+    if len(returns) > 0:
+        return tuple(returns)
+    if pending or selected is not solves:
+        solves = list(iter_query(selected, pending))
+    return solves
@@ -0,0 +1,190 @@
+"""
+rolling window statistics over a list of solve times (integer
+milliseconds, DNF_MS for DNFs), so that every AoN/MoN in a list
+can be computed in a single pass instead of re-grouping the list
+for each window
+"""
+
+from collections import deque
+from collections.abc import Sequence, Iterator
+
+from .models import Operation, DNF_MS
+
+
+def _check_operation(operation: Operation, count: int) -> None:
+    if operation not in ("average", "mean"):
+        raise ValueError(
+            f"Cannot compute a rolling '{operation}', known: 'average', 'mean'"
+        )
+    if count < 1:
+        raise ValueError(f"Cannot do operation '{operation}' with {count} solves")
+    if operation == "average" and count < 3:
+        raise ValueError("Cannot do operation 'average' with less than 3 solves")
+
+
+def divisor(operation: Operation, count: int) -> int:
+    """
+    how many solves count towards the result, the best/worst are trimmed in averages
+    """
+    return count - 2 if operation == "average" else count
+
+
+class _Extremes:
+    """
+    monotonic deques of (index, time) pairs, which track the
+    min/max completed time in the last 'count' indexes pushed
+    """
+
+    def __init__(self, count: int) -> None:
+        self.count = count
+        self._min: deque[tuple[int, int]] = deque()
+        self._max: deque[tuple[int, int]] = deque()
+
+    def push(self, i: int, time: int) -> None:
+        if time != DNF_MS:
+            while self._min and self._min[-1][1] > time:
+                self._min.pop()
+            self._min.append((i, time))
+            while self._max and self._max[-1][1] < time:
+                self._max.pop()
+            self._max.append((i, time))
+        oldest = i - self.count
+        if self._min and self._min[0][0] == oldest:
+            self._min.popleft()
+        if self._max and self._max[0][0] == oldest:
+            self._max.popleft()
+
+    def trimmed_total(self, operation: Operation, total: int, dnfs: int) -> int | None:
+        """
+        given the sum of the completed times and number of DNFs in the
+        window, return the sum of the solves which count towards the
+        result, or None if the window is a DNF
+        """
+        if operation == "mean":
+            return None if dnfs > 0 else total
+        if dnfs > 1:
+            return None
+        # a single DNF is the trimmed worst solve, so only trim the best
+        if dnfs == 1:
+            return total - self._min[0][1]
+        return total - self._min[0][1] - self._max[0][1]
+
+
+class RollingWindow:
+    """
+    Keeps a running sum, a DNF counter and monotonic min/max deques
+    for the last 'count' times pushed into it
+
+    Only the sum of the counted (not trimmed) solves is tracked, the
+    caller divides by 'divisor' to get the actual result
+    """
+
+    def __init__(self, operation: Operation, count: int) -> None:
+        _check_operation(operation, count)
+        self.operation = operation
+        self.count = count
+        self.pushed = 0
+        self._sum = 0
+        self._dnfs = 0
+        self._window: deque[int] = deque()
+        self._extremes = _Extremes(count)
+
+    @property
+    def divisor(self) -> int:
+        return divisor(self.operation, self.count)
+
+    @property
+    def full(self) -> bool:
+        return len(self._window) == self.count
+
+    def push(self, time: int) -> None:
+        self._extremes.push(self.pushed, time)
+        self.pushed += 1
+        self._window.append(time)
+        if time == DNF_MS:
+            self._dnfs += 1
+        else:
+            self._sum += time
+
+        if len(self._window) > self.count:
+            dropped = self._window.popleft()
+            if dropped == DNF_MS:
+                self._dnfs -= 1
+            else:
+                self._sum -= dropped
+
+    def total(self) -> int | None:
+        """
+        the sum of the solves which count towards the current window,
+        or None if the window is a DNF
+        """
+        assert self.full, "window does not have enough solves yet"
+        return self._extremes.trimmed_total(self.operation, self._sum, self._dnfs)
+
+
+def window_totals(
+    times: Sequence[int], operation: Operation, count: int
+) -> Iterator[int | None]:
+    """
+    yields the total (see RollingWindow.total) for every window of
+    'count' times, the first being times[0:count], the next times[1:count + 1]...
+    """
+    window = RollingWindow(operation, count)
+    for t in times:
+        window.push(t)
+        if window.full:
+            yield window.total()
+
+
+def best_window(times: Sequence[int], operation: Operation, count: int) -> int | None:
+    """
+    returns the start index of the window of 'count' times with the
+    best (lowest) result, or None if every window is a DNF
+
+    ties are broken by the earliest window
+    """
+    return best_windows(times, operation, [count]).get(count)
+
+
+def best_windows(
+    times: Sequence[int], operation: Operation, counts: Sequence[int]
+) -> dict[int, int | None]:
+    """
+    like best_window, but for several window sizes in a single pass over 'times'
+
+    The running sums/DNF counts are shared by every window size as prefix
+    sums, only the min/max deques are kept per count. Counts larger than
+    the number of times are not included in the result
+    """
+    for c in counts:
+        _check_operation(operation, c)
+    sizes = [c for c in dict.fromkeys(counts) if c <= len(times)]
+    extremes = {c: _Extremes(c) for c in sizes}
+    best: dict[int, tuple[int | None, int | None]] = {c: (None, None) for c in sizes}
+
+    # sums[i]/dnfs[i] are the totals for times[:i]
+    sums: list[int] = [0]
+    dnfs: list[int] = [0]
+    for i, t in enumerate(times):
+        if t == DNF_MS:
+            sums.append(sums[-1])
+            dnfs.append(dnfs[-1] + 1)
+        else:
+            sums.append(sums[-1] + t)
+            dnfs.append(dnfs[-1])
+        end = i + 1
+        for c in sizes:
+            ext = extremes[c]
+            ext.push(i, t)
+            start = end - c
+            if start < 0:
+                continue
+            total = ext.trimmed_total(
+                operation, sums[end] - sums[start], dnfs[end] - dnfs[start]
+            )
+            if total is None:
+                continue
+            best_total = best[c][1]
+            if best_total is None or total < best_total:
+                best[c] = (start, total)
+    return {c: best[c][0] for c in sizes}
@@ -0,0 +1,297 @@
+"""
+A long-running process which merges the solves once, keeps them in
+memory and answers queries/stats over HTTP (on localhost or a unix socket)
+
+The input files are checked for changes before answering a request, and
+only the files which changed are re-parsed
+"""
+
+import os
+import time
+import socketserver
+from pathlib import Path
+from datetime import datetime
+from typing import Any, NamedTuple, TYPE_CHECKING
+from collections.abc import Callable
+from urllib.parse import urlsplit, parse_qs
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from .log import logger
+from .config import ConfigPaths
+from .models import Solve
+from .cache import MemoryMergeCache
+from .source_merger import merge
+
+if TYPE_CHECKING:
+    from .query import SolveIndex
+
+
+class _Request(NamedTuple):
+    path: str
+    params: dict[str, list[str]]
+
+
+class SolveStore:
+    """
+    Holds the merged solves (sorted by when, oldest first), re-merging
+    them if any of the input files or the sourcemap have changed
+    """
+
+    def __init__(
+        self,
+        sourcemap_file: Path,
+        conf: ConfigPaths,
+        *,
+        cache: bool = True,
+        jobs: int = 1,
+        check_interval: float = 1.0,
+    ) -> None:
+        self.sourcemap_file = sourcemap_file
+        self.conf = conf
+        self.jobs = jobs
+        self.check_interval = check_interval
+        self.merge_cache = MemoryMergeCache(sourcemap_file, persist=cache)
+        self.solves: list[Solve] = []
+        # reverse -> solves, index, built when first queried
+        self._indexed: dict[bool, tuple[list[Solve], "SolveIndex"]] = {}
+        self.loaded_at: datetime | None = None
+        self._fingerprint: tuple[tuple[int, int] | None, ...] | None = None
+        self._last_check = 0.0
+
+    def _paths(self) -> list[Path]:
+        return [self.sourcemap_file] + [p for ps in self.conf.values() for p in ps]
+
+    def fingerprint(self) -> tuple[tuple[int, int] | None, ...]:
+        fp: list[tuple[int, int] | None] = []
+        for p in self._paths():
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                fp.append(None)
+            else:
+                fp.append((st.st_size, st.st_mtime_ns))
+        return tuple(fp)
+
+    def reload(self) -> None:
+        fp = self.fingerprint()
+        start = time.perf_counter()
+        self.solves = list(
+            merge(
+                sourcemap_file=self.sourcemap_file,
+                conf=self.conf,
+                jobs=self.jobs,
+                sort=True,
+                merge_cache=self.merge_cache,
+                # there's no one to prompt, new solves are skipped until
+                # they're added to the sourcemap by running merge
+                interactive=False,
+            )
+        )
+        self._indexed = {}
+        self._fingerprint = fp
+        self.loaded_at = datetime.now()
+        logger.info(
+            f"Loaded {len(self.solves)} solves in {time.perf_counter() - start:.3f}s"
+        )
+
+    def refresh(self, force: bool = False) -> None:
+        """
+        reload if any files changed (checked at most once every check_interval
+        seconds). If that fails, the previously loaded solves are kept
+        """
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        if not force and self.fingerprint() == self._fingerprint:
+            return
+        try:
+            self.reload()
+        except Exception as e:
+            if self.loaded_at is None:
+                raise
+            logger.exception(f"Could not reload solves, using previous data: {e}")
+
+    def indexed(self, reverse: bool) -> tuple[list[Solve], "SolveIndex"]:
+        """
+        the solves (most recent first if reverse) and an index for them, which
+        is kept until the next reload so repeat queries don't have to scan
+        """
+        from .query import SolveIndex
+
+        indexed = self._indexed.get(reverse)
+        if indexed is None:
+            solves = self.solves[::-1] if reverse else self.solves
+            indexed = self._indexed[reverse] = (
+                solves,
+                SolveIndex(solves, when_sorted=True),
+            )
+        return indexed
+
+    def status(self) -> dict[str, Any]:
+        return {
+            "solves": len(self.solves),
+            "files": len(self._paths()) - 1,
+            "loaded_at": self.loaded_at,
+        }
+
+
+def group_stats(solves: list[Solve], counts: list[int]) -> dict[str, Any]:
+    """
+    the same stats as 'merge -a stats', for solves sorted
+    most recent first, as JSON-compatible data
+    """
+    from .group_operations import summarize
+    from .timeformat import format_decimal
+
+    summary = summarize(solves, counts)
+    if summary is None:
+        return {"solve_count": len(solves)}
+    return {
+        "solve_count": summary.solve_count,
+        "best": summary.best.describe(),
+        "worst": summary.worst.describe(),
+        "recent_ao5": (
+            None
+            if summary.recent_ao5 is None
+            else summary.recent_ao5.describe_average()
+        ),
+        "global_mean": format_decimal(summary.global_mean.result),
+        "averages": {
+            f"Ao{c}": {
+                "current": None if st.current is None else st.current.lhs,
+                "best": None if st.best is None else format_decimal(st.best.result),
+            }
+            for c, st in summary.stats.items()
+        },
+    }
+
+
+class QueryHandler:
+    """
+    Answers requests against the solves in a SolveStore, all
+    responses are JSON:
+
+    GET /status
+    GET /reload: reload the solves, even if the files haven't changed
+    GET /query?q=...: run a query (each q is one -q argument to merge),
+        add reverse=1 to get the most recent solves first
+    GET /stats?group_by=...&count=...&q=...: the same stats as
+        'merge -a stats', for each group after running the query
+    """
+
+    GROUP_BY = ("puzzle", "event_code", "event_description")
+
+    def __init__(self, store: SolveStore, serialize: Callable[[Any], str]) -> None:
+        self.store = store
+        self.serialize = serialize
+
+    def _query(self, params: dict[str, list[str]], reverse: bool) -> Any:
+        from .query import parse_query, run_query
+
+        solves, index = self.store.indexed(reverse)
+        return run_query(solves, query=parse_query(params.get("q", [])), index=index)
+
+    def handle(self, req: _Request) -> tuple[int, Any]:
+        """returns the HTTP status and the data to serialize"""
+        if req.path == "/reload":
+            self.store.refresh(force=True)
+            return 200, self.store.status()
+        self.store.refresh()
+        if req.path == "/status":
+            return 200, self.store.status()
+
+        reverse = req.params.get("reverse", ["0"])[-1] not in ("0", "false", "")
+        if req.path == "/query":
+            data = self._query(req.params, reverse)
+            if isinstance(data, tuple):
+                return 200, {"output": list(data)}
+            return 200, {"solves": data}
+        if req.path == "/stats":
+            group_by = req.params.get("group_by", ["event_description"])[-1]
+            if group_by not in self.GROUP_BY:
+                raise ValueError(f"group_by should be one of {self.GROUP_BY}")
+            counts = [int(c) for c in req.params.get("count", ["5", "12", "50", "100"])]
+            if any(c < 3 for c in counts):
+                raise ValueError("counts should be at least 3")
+            # stats are for the most recent solves, unless reverse=0 is passed
+            data = self._query(req.params, "reverse" not in req.params or reverse)
+            if isinstance(data, tuple):
+                raise ValueError("stats queries can only filter solves")
+            groups: dict[str, list[Solve]] = {}
+            for s in data:
+                groups.setdefault(getattr(s, group_by), []).append(s)
+            return 200, {
+                k: group_stats(v, counts)
+                for k, v in sorted(groups.items(), key=lambda kv: -len(kv[1]))
+            }
+        return 404, {"error": f"Unknown path {req.path}"}
+
+    def respond(self, raw_path: str) -> tuple[int, str]:
+        url = urlsplit(raw_path)
+        req = _Request(path=url.path.rstrip("/") or "/", params=parse_qs(url.query))
+        start = time.perf_counter()
+        try:
+            code, data = self.handle(req)
+        except (ValueError, AssertionError) as e:
+            code, data = 400, {"error": str(e)}
+        except Exception as e:
+            logger.exception(f"Error handling {raw_path}")
+            code, data = 500, {"error": f"{type(e).__name__}: {e}"}
+        logger.debug(
+            f"{raw_path} {code} in {(time.perf_counter() - start) * 1000:.1f}ms"
+        )
+        return code, self.serialize(data)
+
+
+def _request_handler(handler: QueryHandler) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            code, body = handler.respond(self.path)
+            data = body.encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_POST = do_GET
+
+        def log_message(self, format: str, *args: Any) -> None:
+            # logged by QueryHandler instead
+            pass
+
+    return Handler
+
+
+def serve(
+    store: SolveStore,
+    *,
+    serialize: Callable[[Any], str],
+    host: str = "127.0.0.1",
+    port: int = 8555,
+    socket_path: Path | None = None,
+) -> None:
+    """
+    load the solves and serve requests until interrupted. If socket_path
+    is passed this listens on that unix socket instead of host/port
+    """
+    store.refresh(force=True)
+    handler_cls = _request_handler(QueryHandler(store, serialize))
+    server: socketserver.BaseServer
+    if socket_path is not None:
+        if socket_path.exists():
+            socket_path.unlink()
+        server = socketserver.UnixStreamServer(str(socket_path), handler_cls)
+        logger.info(f"Listening on {socket_path}")
+    else:
+        server = HTTPServer((host, port), handler_cls)
+        logger.info(f"Listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path is not None and socket_path.exists():
+            os.unlink(socket_path)
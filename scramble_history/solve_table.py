@@ -0,0 +1,227 @@
+"""
+A column-oriented ('struct of arrays') representation of merged solves,
+which uses far less memory than a list of Solve objects and lets
+filters/sorts run vectorized
+
+This requires numpy, install with pip install 'scramble_history[optional]'
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, NamedTuple, overload
+from collections.abc import Iterator, Sequence
+
+import numpy as np
+import numpy.typing as npt
+
+from .models import Solve, State, DNF_MS
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# state is stored as the index into this list
+STATES: list[State] = list(State)
+_STATE_CODES: dict[State, int] = {st: i for i, st in enumerate(STATES)}
+SOLVED_CODE = _STATE_CODES[State.SOLVED]
+
+# attributes which are dictionary-encoded
+CATEGORICAL = ("puzzle", "event_code", "event_description")
+
+
+class Categorical(NamedTuple):
+    """
+    a dictionary-encoded string column, codes index into values
+    """
+
+    codes: npt.NDArray[np.int32]
+    values: list[str]
+
+    @classmethod
+    def encode(cls, data: Sequence[str]) -> "Categorical":
+        lookup: dict[str, int] = {}
+        codes = np.fromiter(
+            (lookup.setdefault(d, len(lookup)) for d in data),
+            dtype=np.int32,
+            count=len(data),
+        )
+        return cls(codes=codes, values=list(lookup))
+
+    def code(self, value: str) -> int | None:
+        try:
+            return self.values.index(value)
+        except ValueError:
+            return None
+
+    def mask(self, values: set[str]) -> npt.NDArray[np.bool_]:
+        """boolean mask of rows which are one of 'values'"""
+        codes = [c for c in (self.code(v) for v in values) if c is not None]
+        return np.isin(self.codes, codes)
+
+    def take(self, idx: Any) -> "Categorical":
+        return Categorical(codes=self.codes[idx], values=self.values)
+
+    def decode(self, i: int) -> str:
+        return self.values[int(self.codes[i])]
+
+
+class SolveTable:
+    """
+    Holds the same data as a list[Solve], as columns:
+
+    time_ms/penalty_ms/full_time_ms: int64 milliseconds
+    when_ms: int64 milliseconds since the epoch (UTC)
+    state: uint8 index into STATES
+    puzzle/event_code/event_description: dictionary-encoded strings
+    scramble/comment: plain python lists
+    """
+
+    def __init__(
+        self,
+        *,
+        time_ms: npt.NDArray[np.int64],
+        penalty_ms: npt.NDArray[np.int64],
+        full_time_ms: npt.NDArray[np.int64],
+        when_ms: npt.NDArray[np.int64],
+        state: npt.NDArray[np.uint8],
+        puzzle: Categorical,
+        event_code: Categorical,
+        event_description: Categorical,
+        scramble: list[str],
+        comment: list[str | None],
+    ) -> None:
+        self.time_ms = time_ms
+        self.penalty_ms = penalty_ms
+        self.full_time_ms = full_time_ms
+        self.when_ms = when_ms
+        self.state = state
+        self.puzzle = puzzle
+        self.event_code = event_code
+        self.event_description = event_description
+        self.scramble = scramble
+        self.comment = comment
+
+    @classmethod
+    def from_solves(cls, solves: Sequence[Solve]) -> "SolveTable":
+        n = len(solves)
+
+        def ints(vals: Iterator[int]) -> npt.NDArray[np.int64]:
+            return np.fromiter(vals, dtype=np.int64, count=n)
+
+        return cls(
+            time_ms=ints(s.time_ms for s in solves),
+            penalty_ms=ints(s.penalty_ms for s in solves),
+            full_time_ms=ints(s.full_time_ms for s in solves),
+            when_ms=ints((s.when - EPOCH) // timedelta(milliseconds=1) for s in solves),
+            state=np.fromiter(
+                (_STATE_CODES[s.state] for s in solves), dtype=np.uint8, count=n
+            ),
+            puzzle=Categorical.encode([s.puzzle for s in solves]),
+            event_code=Categorical.encode([s.event_code for s in solves]),
+            event_description=Categorical.encode([s.event_description for s in solves]),
+            scramble=[s.scramble for s in solves],
+            comment=[s.comment for s in solves],
+        )
+
+    def solve(self, i: int) -> Solve:
+        return Solve(
+            puzzle=self.puzzle.decode(i),
+            event_code=self.event_code.decode(i),
+            event_description=self.event_description.decode(i),
+            state=STATES[self.state[i]],
+            scramble=self.scramble[i],
+            comment=self.comment[i],
+            time_ms=int(self.time_ms[i]),
+            penalty_ms=int(self.penalty_ms[i]),
+            full_time_ms=int(self.full_time_ms[i]),
+            when=EPOCH + timedelta(milliseconds=int(self.when_ms[i])),
+        )
+
+    def to_solves(self) -> list[Solve]:
+        return [self.solve(i) for i in range(len(self))]
+
+    def __len__(self) -> int:
+        return len(self.time_ms)
+
+    def __iter__(self) -> Iterator[Solve]:
+        for i in range(len(self)):
+            yield self.solve(i)
+
+    @overload
+    def __getitem__(self, idx: int) -> Solve: ...
+
+    @overload
+    def __getitem__(self, idx: slice | npt.NDArray[Any]) -> "SolveTable": ...
+
+    def __getitem__(self, idx: int | slice | npt.NDArray[Any]) -> "Solve | SolveTable":
+        """
+        an int returns a single Solve, a slice, boolean mask
+        or array of indexes returns a new SolveTable
+        """
+        if isinstance(idx, (int, np.integer)):
+            return self.solve(int(idx))
+        if isinstance(idx, slice):
+            pick_list: Any = idx
+        else:
+            if idx.dtype == np.bool_:
+                idx = np.flatnonzero(idx)
+            pick_list = idx.tolist()
+        return SolveTable(
+            time_ms=self.time_ms[idx],
+            penalty_ms=self.penalty_ms[idx],
+            full_time_ms=self.full_time_ms[idx],
+            when_ms=self.when_ms[idx],
+            state=self.state[idx],
+            puzzle=self.puzzle.take(idx),
+            event_code=self.event_code.take(idx),
+            event_description=self.event_description.take(idx),
+            scramble=_take(self.scramble, pick_list),
+            comment=_take(self.comment, pick_list),
+        )
+
+    def times_ms(self) -> npt.NDArray[np.int64]:
+        """full_time_ms, with DNF_MS for solves that weren't completed"""
+        return np.where(self.state == SOLVED_CODE, self.full_time_ms, DNF_MS)
+
+    def mask(self, attr: str, values: set[str]) -> npt.NDArray[np.bool_]:
+        """boolean mask of rows where 'attr' is one of 'values'"""
+        if attr in CATEGORICAL:
+            col: Categorical = getattr(self, attr)
+            return col.mask(values)
+        if attr in ("scramble", "comment"):
+            return np.fromiter(
+                (v in values for v in getattr(self, attr)),
+                dtype=np.bool_,
+                count=len(self),
+            )
+        raise AttributeError(f"could not find attribute {attr} on SolveTable")
+
+    def when_mask(
+        self, start: datetime | None, end: datetime | None
+    ) -> npt.NDArray[np.bool_]:
+        """boolean mask of rows where start <= when < end (None if unbounded)"""
+        mask = np.ones(len(self), dtype=np.bool_)
+        if start is not None:
+            mask &= self.when_ms >= (start - EPOCH) // timedelta(milliseconds=1)
+        if end is not None:
+            mask &= self.when_ms < (end - EPOCH) // timedelta(milliseconds=1)
+        return mask
+
+    def sort_by_when(self, reverse: bool = False) -> "SolveTable":
+        # negate instead of reversing so that, like list.sort,
+        # solves with the same time keep their order
+        key = -self.when_ms if reverse else self.when_ms
+        return self[np.argsort(key, kind="stable")]
+
+    def group_by(self, attr: str) -> dict[str, "SolveTable"]:
+        """like itertools.groupby on a list sorted by 'attr'"""
+        assert attr in CATEGORICAL, f"can only group by one of {CATEGORICAL}"
+        col: Categorical = getattr(self, attr)
+        present: list[int] = np.unique(col.codes).tolist()
+        return {
+            col.values[code]: self[col.codes == code]
+            for code in sorted(present, key=col.values.__getitem__)
+        }
+
+
+def _take(data: list[Any], idx: slice | list[int]) -> list[Any]:
+    if isinstance(idx, slice):
+        return data[idx]
+    return [data[i] for i in idx]
@@ -8,14 +8,17 @@ import json
 import warnings
 from pprint import pprint
 from pathlib import Path
+from datetime import datetime
 from dataclasses import is_dataclass, asdict
-from typing import NamedTuple, Any, TYPE_CHECKING
-from collections.abc import Iterator
+from typing import NamedTuple, Any, Hashable, TYPE_CHECKING
+from itertools import chain, repeat
+from collections.abc import Iterator, Iterable
 
 if TYPE_CHECKING:
     from prompt_toolkit.completion import FuzzyWordCompleter
 
 
+from .log import logger
 from .models import Solve
 
 
@@ -41,18 +44,44 @@ class SourceMap(NamedTuple):
     transformed_event_description: str
 
 
+# used as the value for fields which don't exist on a solve
+_MISSING = object()
+
+
+class _ClassIndex(NamedTuple):
+    # every field used by any sourcemap entry for this class,
+    # the values of these are the 'signature' of a solve
+    keys: tuple[str, ...]
+    # sourcemap entries for this class, in order, with their fields as indexes into keys
+    entries: list[tuple[SourceMap, list[tuple[int, Any]]]]
+    # signature -> matching sourcemap entry (or None)
+    memo: dict[tuple[Hashable, ...], SourceMap | None]
+
+
 class SourceMerger:
-    def __init__(self, sourcemap_file: Path) -> None:
+    def __init__(self, sourcemap_file: Path, interactive: bool = True) -> None:
         self.sourcemap_file = sourcemap_file
+        # if False, solves which don't match the sourcemap are skipped
+        # (see transform_all) instead of prompting for a new entry
+        self.interactive = interactive
+        # how many solves have been skipped, so partial results aren't cached
+        self.skipped = 0
         self.sourcemap: list[SourceMap] = []
+        self._index: dict[str, _ClassIndex] | None = None
+        self._classnames: dict[type, str] = {}
         self.load()
 
     def load(self) -> None:
         if self.sourcemap_file.exists():
             self.sourcemap = self.sourcemap_loads(self.sourcemap_file.read_text())
+        self._index = None
 
     def dump(self) -> None:
-        self.sourcemap_file.write_text(self.sourcemap_dumps(self.sourcemap))
+        # write to a temporary file first, so this is never
+        # read partially written (e.g. by merge worker processes)
+        tmp = self.sourcemap_file.with_suffix(".tmp")
+        tmp.write_text(self.sourcemap_dumps(self.sourcemap))
+        tmp.replace(self.sourcemap_file)
 
     @staticmethod
     def sourcemap_loads(json_data: str) -> list[SourceMap]:
@@ -152,6 +181,7 @@ class SourceMerger:
             transformed_event_description=transformed_event_description,
         )
         self.sourcemap.append(sm)
+        self._index = None
         self.dump()
         return sm
 
@@ -159,14 +189,55 @@ class SourceMerger:
     def _qualclassname(solve: Any) -> str:
         return f"{solve.__module__}.{solve.__class__.__name__}"
 
-    def match_sourcemap(self, solve: Any) -> SourceMap | None:
+    def _classname(self, solve: Any) -> str:
+        tp = type(solve)
+        name = self._classnames.get(tp)
+        if name is None:
+            name = self._classnames[tp] = self._qualclassname(solve)
+        return name
+
+    def _build_index(self) -> dict[str, _ClassIndex]:
+        by_class: dict[str, list[SourceMap]] = {}
         for s in self.sourcemap:
-            if s.source_class_name != self._qualclassname(solve):
-                continue
-            if all(
-                hasattr(solve, k) and getattr(solve, k) == v
-                for k, v in s.source_fields_match.items()
-            ):
+            by_class.setdefault(s.source_class_name, []).append(s)
+        index = {}
+        for classname, sms in by_class.items():
+            keys = tuple(dict.fromkeys(k for s in sms for k in s.source_fields_match))
+            entries = [
+                (s, [(keys.index(k), v) for k, v in s.source_fields_match.items()])
+                for s in sms
+            ]
+            index[classname] = _ClassIndex(keys=keys, entries=entries, memo={})
+        return index
+
+    def match_sourcemap(self, solve: Any) -> SourceMap | None:
+        """
+        find the first sourcemap entry which matches this solve
+
+        The sourcemap is indexed by class, and the result for each distinct
+        set of field values is memoized, so solves from the same session only
+        have to be compared against the sourcemap once
+        """
+        if self._index is None:
+            self._index = self._build_index()
+        ci = self._index.get(self._classname(solve))
+        if ci is None:
+            return None
+        sig = tuple(getattr(solve, k, _MISSING) for k in ci.keys)
+        try:
+            return ci.memo[sig]
+        except KeyError:
+            pass
+        except TypeError:
+            # some field is unhashable, so this can't be memoized
+            return self._match_signature(ci, sig)
+        match = ci.memo[sig] = self._match_signature(ci, sig)
+        return match
+
+    @staticmethod
+    def _match_signature(ci: _ClassIndex, sig: tuple[Any, ...]) -> SourceMap | None:
+        for s, fields in ci.entries:
+            if all(sig[i] is not _MISSING and sig[i] == v for i, v in fields):
                 return s
         return None
 
@@ -186,22 +257,180 @@ class SourceMerger:
             **transformed_data,
         )
 
+    def transform_all(self, solves: Iterable[Any]) -> list[Solve]:
+        if self.interactive:
+            return list(map(self.transform, solves))
+        transformed: list[Solve] = []
+        unmatched: dict[str, int] = {}
+        for solve in solves:
+            sourcemap = self.match_sourcemap(solve)
+            if sourcemap is None:
+                name = self._classname(solve)
+                unmatched[name] = unmatched.get(name, 0) + 1
+                continue
+            transformed.append(self.transform(solve, sourcemap))
+        for name, count in unmatched.items():
+            self.skipped += count
+            logger.warning(
+                f"Skipped {count} {name} solves which don't match anything in {self.sourcemap_file}, run merge to add an entry for them"
+            )
+        return transformed
+
 
 from .config import KNOWN_PARSERS, ConfigPaths
+from .cache import MergeCache, encode_solves, decode_solves
+
+
+def parse_file(parser: str, path: Path) -> Iterator[Any]:
+    """parse a single file into the solves for that source"""
+    assert parser in KNOWN_PARSERS
+    if parser == "cstimer":
+        from .cstimer import iter_file
 
+        return iter_file(path)
+    else:
+        from .twistytimer import parse_file as twistytimer_parse
 
-def merge(sourcemap_file: Path, conf: ConfigPaths) -> Iterator[Solve]:
-    from .cstimer import merge_files as cstimer_merge
-    from .twistytimer import merge_files as twistytimer_merge
+        return twistytimer_parse(path)
 
+
+def _parse_and_transform(
+    parser: str, path: Path, sourcemap_file: Path
+) -> tuple[list[Any] | None, dict[str, Any] | None]:
+    """
+    runs in a worker process. If every solve in the file matches the
+    sourcemap, they're transformed and returned encoded (which is much
+    cheaper to send back than the parsed solves), as the second item
+
+    Otherwise, the parsed solves are returned as the first item, so the
+    main process can prompt for the new sourcemap entries
+    """
     merger = SourceMerger(sourcemap_file)
+    parsed = list(parse_file(parser, path))
+    matches = [merger.match_sourcemap(s) for s in parsed]
+    if any(m is None for m in matches):
+        return parsed, None
+    return None, encode_solves(list(map(merger.transform, parsed, matches)))
+
+
+def _merge_files(
+    files: list[tuple[str, Path]], merger: SourceMerger, jobs: int
+) -> Iterator[list[Solve]]:
+    """
+    parse and transform each file, in the same order as 'files'
+
+    if jobs > 1, files are parsed in parallel using a process pool. Any
+    new sourcemap entries are still prompted for in the main process, in order
+    """
+    if jobs <= 1 or len(files) <= 1:
+        for parser, path in files:
+            yield merger.transform_all(parse_file(parser, path))
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(files))) as executor:
+        results = executor.map(
+            _parse_and_transform,
+            [f[0] for f in files],
+            [f[1] for f in files],
+            [merger.sourcemap_file] * len(files),
+        )
+        for parsed, encoded in results:
+            if encoded is not None:
+                yield decode_solves(encoded)
+            else:
+                assert parsed is not None
+                yield merger.transform_all(parsed)
+
+
+def _when(solve: Solve) -> datetime:
+    return solve.when
+
+
+def merge(
+    sourcemap_file: Path,
+    conf: ConfigPaths,
+    *,
+    cache: bool = False,
+    jobs: int = 1,
+    sort: bool = False,
+    reverse: bool = False,
+    merge_cache: MergeCache | None = None,
+    interactive: bool = True,
+) -> Iterator[Solve]:
+    """
+    parses and transforms the solves from each file, removing any duplicates
+
+    if cache is True, the transformed solves from each file are
+    cached, and re-used if that file (and the sourcemap) are unchanged.
+    A merge_cache can be passed to use instead of the default one
+
+    if interactive is False, solves which don't match any sourcemap
+    entries are skipped (and logged), instead of prompting for them. Files
+    which had solves skipped aren't cached
+
+    if jobs > 1, files are parsed in parallel. The solves are still
+    transformed/de-duplicated in the main process in the same order,
+    so the result is the same as parsing them one at a time
+
+    if sort is True, the solves are yielded sorted by when (newest first if
+    reverse is True). Each file is sorted separately (they're usually sorted
+    already, which makes that cheap), and then merged with a heap, so this
+    is the same as sorting the whole result, but doesn't have to be
+    done all at once
+    """
+    from more_itertools import unique_everseen
+
+    merger = SourceMerger(sourcemap_file, interactive=interactive)
+    if merge_cache is None and cache:
+        merge_cache = MergeCache(sourcemap_file)
+
+    files = [(flag, p) for flag, paths in conf.items() for p in paths]
+    merged: dict[tuple[str, Path], list[Solve]] = {}
+    if merge_cache is not None:
+        for flag, p in files:
+            cached = merge_cache.load(flag, p)
+            if cached is not None:
+                merged[(flag, p)] = cached
+
+    uncached = [f for f in files if f not in merged]
+    skipped = merger.skipped
+    for (flag, p), solves in zip(uncached, _merge_files(uncached, merger, jobs)):
+        # if any solves were skipped, this isn't the whole file. Caching it
+        # would mean a later interactive merge never prompts for them
+        if merge_cache is not None and merger.skipped == skipped:
+            merge_cache.store(flag, p, solves)
+        skipped = merger.skipped
+        merged[(flag, p)] = solves
 
     for flag, grouped_files in conf.items():
         assert flag in KNOWN_PARSERS
-        mergefunc = cstimer_merge if flag == "cstimer" else twistytimer_merge
-        slv = list(mergefunc(grouped_files))
-        if len(slv) == 0:
+        if all(len(merged[(flag, p)]) == 0 for p in grouped_files):
             warnings.warn(
                 f"Did not parse any solves from {flag} {grouped_files}, double check to make sure inputs are correct"
             )
-        yield from map(merger.transform, slv)
+
+    # the same solve could be in multiple exports (e.g. backups
+    # from different days), so remove any duplicates from each parser
+    if not sort:
+        for flag, grouped_files in conf.items():
+            yield from unique_everseen(
+                chain.from_iterable(merged[(flag, p)] for p in grouped_files),
+                key=lambda s: (s.full_time_ms, s.when),
+            )
+        return
+
+    import heapq
+
+    # heapq.merge and sorted are both stable, so solves with the same 'when'
+    # stay in file order, and the first duplicate is kept, like above
+    runs = [
+        zip(repeat(flag), sorted(merged[(flag, p)], key=_when, reverse=reverse))
+        for flag, p in files
+    ]
+    for _, solve in unique_everseen(
+        heapq.merge(*runs, key=lambda fs: fs[1].when, reverse=reverse),
+        key=lambda fs: (fs[0], fs[1].full_time_ms, fs[1].when),
+    ):
+        yield solve
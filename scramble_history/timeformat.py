@@ -1,8 +1,12 @@
-import numpy  # type: ignore[import]
 from decimal import Decimal
+from typing import TYPE_CHECKING, Union
 
+# only used for the type hint, importing numpy is slow
+if TYPE_CHECKING:
+    import numpy
 
-def format_decimal(d: Decimal | float | numpy.float64) -> str:
+
+def format_decimal(d: Union[Decimal, float, "numpy.float64"]) -> str:
     """Formats time into h:mm:ss.xxx, removing leftmost places if they are zero"""
     minutes, seconds = divmod(float(d), 60)
     hours, minutes = divmod(minutes, 60)
@@ -10,29 +10,46 @@ from datetime import datetime, timezone
 
 from more_itertools import unique_everseen
 
-from .models import State
+from .models import State, from_ms
 
 
 class Solve(NamedTuple):
     puzzle: str
     category: str
     scramble: str
-    time: Decimal
-    penalty: Decimal
+    time_ms: int
+    penalty_ms: int
     dnf: bool
     when: datetime
     comment: str
 
+    @property
+    def time(self) -> Decimal:
+        return from_ms(self.time_ms)
+
+    @property
+    def penalty(self) -> Decimal:
+        return from_ms(self.penalty_ms)
+
+    def for_json(self) -> dict[str, Any]:
+        # times are in seconds in JSON
+        data: dict[str, Any] = {}
+        for key, val in self._asdict().items():
+            if key in ("time_ms", "penalty_ms"):
+                key, val = key.removesuffix("_ms"), from_ms(val)
+            data[key] = val
+        return data
+
     def to_csv_list(self) -> list[str]:
         penalty_code = 0
-        if self.penalty == Decimal("2"):
+        if self.penalty_ms == 2000:
             penalty_code = 1
         if self.dnf:
             penalty_code = 2
         return [
             self.puzzle,
             self.category,
-            str(int(self.time * 1000)),
+            str(self.time_ms),
             str(int(self.when.timestamp() * 1000)),
             self.scramble,
             str(penalty_code),
@@ -51,10 +68,10 @@ class Solve(NamedTuple):
             state=State.DNF if self.dnf else State.SOLVED,
             scramble=self.scramble,
             comment=self.comment,
-            time=self.time,
-            penalty=self.penalty,
+            time_ms=self.time_ms,
+            penalty_ms=self.penalty_ms,
+            full_time_ms=self.time_ms + self.penalty_ms,
             when=self.when,
-            full_time=self.time + self.penalty,
         )
 
 
@@ -84,17 +101,17 @@ def parse_file(path: Path) -> Iterator[Solve]:
                     file=sys.stderr,
                 )
                 raise
-            upenalty = 0
+            penalty_ms = 0
             is_dnf = penalty == "2"
             if penalty == "1":
-                upenalty = 2
+                penalty_ms = 2000
             yield Solve(
                 puzzle=puzzle,
                 category=category,
                 scramble=scramble,
-                time=Decimal(time) / 1000,
+                time_ms=int(time),
                 dnf=is_dnf,
-                penalty=Decimal(upenalty),
+                penalty_ms=penalty_ms,
                 when=datetime.fromtimestamp(int(date) / 1000, tz=timezone.utc),
                 comment=comment,
             )
@@ -103,5 +120,5 @@ def parse_file(path: Path) -> Iterator[Solve]:
 def merge_files(paths: list[Path]) -> Iterator[Solve]:
     yield from unique_everseen(
         chain(*(parse_file(p) for p in paths)),
-        key=lambda s: (s.time + s.penalty, s.when),
+        key=lambda s: (s.time_ms + s.penalty_ms, s.when),
     )
@@ -0,0 +1,314 @@
+"""
+Keeps the stats for 'merge -a stats --watch' up to date as the input
+files change, re-parsing only the files which changed and updating the
+stats only for the groups they affected
+
+The files are polled (checking their size/mtime), there are only ever
+a few of them so that's cheap, and it doesn't need any extra dependencies
+"""
+
+import time
+from pathlib import Path
+from datetime import datetime
+from collections.abc import Callable
+
+from .log import logger
+from .config import ConfigPaths
+from .models import Solve, State, DNF_MS, from_ms
+from .rolling import RollingWindow
+from .group_operations import Grouping, Stats, Summary, grouped
+from .error import unwrap
+from .cache import MergeCache
+from .source_merger import SourceMerger, _merge_files
+
+# solves from the same parser with these are duplicates, like in merge
+SolveKey = tuple[str, int, datetime]
+File = tuple[str, Path]
+
+
+class RunningSummary:
+    """
+    The same stats as group_operations.summarize, kept up to date as
+    solves are pushed (oldest first) instead of re-computing them
+    """
+
+    def __init__(self, counts: list[int]) -> None:
+        self.counts = list(dict.fromkeys(counts))
+        # oldest first
+        self.solves: list[Solve] = []
+        self._windows = {c: RollingWindow("average", c) for c in self.counts}
+        # count -> start index, total of the best window
+        self._best_windows: dict[int, tuple[int, int]] = {}
+        # indexes/times of the best/worst single
+        self._best: int | None = None
+        self._best_ms = 0
+        self._worst: int | None = None
+        self._worst_ms = 0
+        self._completed = 0
+        self._completed_total = 0
+
+    def push(self, solve: Solve) -> None:
+        i = len(self.solves)
+        self.solves.append(solve)
+        ms = solve.result_ms
+        if ms != DNF_MS:
+            self._completed += 1
+            self._completed_total += ms
+            # summarize looks at the most recent solves first, so
+            # ties go to the most recent solve/window
+            if self._best is None or ms <= self._best_ms:
+                self._best, self._best_ms = i, ms
+            if self._worst is None or ms >= self._worst_ms:
+                self._worst, self._worst_ms = i, ms
+        for c, window in self._windows.items():
+            window.push(ms)
+            if not window.full:
+                continue
+            total = window.total()
+            if total is None:
+                continue
+            best = self._best_windows.get(c)
+            if best is None or total <= best[1]:
+                self._best_windows[c] = (i - c + 1, total)
+
+    def _recent(self, count: int) -> list[Solve]:
+        """the last 'count' solves, most recent first"""
+        return self.solves[: -count - 1 : -1]
+
+    def summary(self) -> Summary | None:
+        if self._best is None or self._worst is None:
+            return None
+        stats: dict[int, Stats] = {}
+        for c in self.counts:
+            current = grouped(self._recent(c), operation="average", count=c)
+            best = self._best_windows.get(c)
+            stats[c] = Stats(
+                count_=c,
+                current=None if isinstance(current, Exception) else current,
+                best=(
+                    None
+                    if best is None
+                    else unwrap(
+                        grouped(
+                            self.solves[best[0] : best[0] + c][::-1],
+                            operation="average",
+                            count=c,
+                        )
+                    )
+                ),
+            )
+        recent_ao5 = grouped(self._recent(5), operation="average", count=5)
+        return Summary(
+            solve_count=len(self.solves),
+            best=self.solves[self._best],
+            worst=self.solves[self._worst],
+            recent_ao5=None if isinstance(recent_ao5, Exception) else recent_ao5,
+            global_mean=Grouping(
+                operation="global_mean",
+                state=State.SOLVED,
+                result=from_ms(self._completed_total, self._completed),
+                solves=self.solves[::-1],
+                solve_count=self._completed,
+            ),
+            stats=stats,
+        )
+
+
+def _stamp(path: Path) -> tuple[int, int] | None:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+class WatchedMerge:
+    """
+    The merged solves, grouped by 'group_by', which can be updated
+    when files change without re-parsing the others. If cache is True,
+    the solves from each file are cached like in merge
+
+    'resolve' is called on every update to get the input files, so
+    any new files which match globs in the config are picked up
+    """
+
+    def __init__(
+        self,
+        sourcemap_file: Path,
+        resolve: Callable[[], ConfigPaths],
+        *,
+        group_by: str,
+        counts: list[int],
+        include: Callable[[Solve], bool] = lambda s: True,
+        cache: bool = False,
+    ) -> None:
+        self.sourcemap_file = sourcemap_file
+        self.resolve = resolve
+        self.group_by = group_by
+        self.counts = counts
+        self.include = include
+        self.merger = SourceMerger(sourcemap_file)
+        self.merge_cache = MergeCache(sourcemap_file) if cache else None
+        self._reset()
+
+    def _reset(self) -> None:
+        self.groups: dict[str, RunningSummary] = {}
+        self.files: list[File] = []
+        # the first file a solve was seen in is the one that's used,
+        # so files are numbered in the order they were first seen
+        self._order: dict[File, int] = {}
+        self._by_order: dict[int, File] = {}
+        self._stamps: dict[File, tuple[int, int] | None] = {}
+        self._file_solves: dict[File, dict[SolveKey, Solve]] = {}
+        self._owners: dict[SolveKey, list[int]] = {}
+        self._solves: dict[SolveKey, Solve] = {}
+        self._sourcemap_stamp = _stamp(self.sourcemap_file)
+
+    def _group(self, solve: Solve) -> str:
+        group: str = getattr(solve, self.group_by)
+        return group
+
+    def _replace(
+        self, file: File, solves: dict[SolveKey, Solve], added: list[Solve]
+    ) -> set[str]:
+        """
+        replace the solves from 'file', adding any new solves to 'added',
+        returns any groups which have to be rebuilt (solves were removed,
+        or a duplicate from another file is now used)
+        """
+        rebuild: set[str] = set()
+        order = self._order[file]
+        old = self._file_solves.get(file, {})
+        # solves which are in both are the same (same parser, time and date),
+        # and the transforms only change if the sourcemap does
+        for key in old.keys() - solves.keys():
+            owners = self._owners[key]
+            was_used = owners[0] == order
+            owners.remove(order)
+            if not was_used:
+                continue
+            solve = self._solves.pop(key)
+            if self.include(solve):
+                rebuild.add(self._group(solve))
+            if owners:
+                self._solves[key] = self._file_solves[self._by_order[owners[0]]][key]
+            else:
+                del self._owners[key]
+        for key in solves.keys() - old.keys():
+            solve = solves[key]
+            owners = self._owners.setdefault(key, [])
+            owners.append(order)
+            owners.sort()
+            if len(owners) == 1:
+                self._solves[key] = solve
+                added.append(solve)
+            elif owners[0] == order:
+                replaced = self._solves[key]
+                self._solves[key] = solve
+                for s in (replaced, solve):
+                    if self.include(s):
+                        rebuild.add(self._group(s))
+        if solves:
+            self._file_solves[file] = solves
+        else:
+            self._file_solves.pop(file, None)
+        return rebuild
+
+    def _parse(self, file: File) -> dict[SolveKey, Solve] | None:
+        solves = None
+        if self.merge_cache is not None:
+            solves = self.merge_cache.load(*file)
+        if solves is None:
+            try:
+                (solves,) = _merge_files([file], self.merger, jobs=1)
+            except Exception as e:
+                logger.warning(
+                    f"Could not parse {file[1]}, will retry when it changes: {e}"
+                )
+                return None
+            if self.merge_cache is not None:
+                self.merge_cache.store(*file, solves)
+        parsed: dict[SolveKey, Solve] = {}
+        for s in solves:
+            parsed.setdefault((file[0], s.full_time_ms, s.when), s)
+        return parsed
+
+    def update(self) -> set[str]:
+        """re-parse any files which changed, returns the groups which changed"""
+        start = time.perf_counter()
+        if _stamp(self.sourcemap_file) != self._sourcemap_stamp:
+            # transforms could have changed, so start from scratch
+            logger.info("sourcemap changed, reloading everything")
+            self.merger.load()
+            previous = set(self.groups)
+            self._reset()
+            return self.update() | previous
+
+        try:
+            conf = self.resolve()
+        except Exception as e:
+            logger.warning(f"Could not resolve input files: {e}")
+            return set()
+        files = [(flag, p) for flag, paths in conf.items() for p in paths]
+        for f in files:
+            if f not in self._order:
+                self._by_order[len(self._order)] = f
+                self._order[f] = len(self._order)
+
+        added: list[Solve] = []
+        rebuild: set[str] = set()
+        for f in self.files:
+            if f not in files:
+                rebuild |= self._replace(f, {}, added)
+                self._stamps.pop(f, None)
+        for f in files:
+            stamp = _stamp(f[1])
+            if stamp == self._stamps.get(f):
+                continue
+            self._stamps[f] = stamp
+            parsed = self._parse(f)
+            if parsed is not None:
+                rebuild |= self._replace(f, parsed, added)
+        self.files = files
+        # the sourcemap is written to when new entries are prompted for
+        self._sourcemap_stamp = _stamp(self.sourcemap_file)
+
+        changed = set(rebuild)
+        added.sort(key=lambda s: s.when)
+        for solve in added:
+            if not self.include(solve):
+                continue
+            group = self._group(solve)
+            changed.add(group)
+            if group in rebuild:
+                continue
+            running = self.groups.get(group)
+            if running is None:
+                running = self.groups[group] = RunningSummary(self.counts)
+            # new solves are usually the most recent ones, otherwise
+            # the stats for the whole group have to be re-computed
+            if running.solves and solve.when < running.solves[-1].when:
+                rebuild.add(group)
+            else:
+                running.push(solve)
+
+        if rebuild:
+            by_group: dict[str, list[Solve]] = {g: [] for g in rebuild}
+            for solve in self._solves.values():
+                if self.include(solve):
+                    group_solves = by_group.get(self._group(solve))
+                    if group_solves is not None:
+                        group_solves.append(solve)
+            for group, group_solves in by_group.items():
+                if not group_solves:
+                    self.groups.pop(group, None)
+                    continue
+                running = self.groups[group] = RunningSummary(self.counts)
+                for solve in sorted(group_solves, key=lambda s: s.when):
+                    running.push(solve)
+
+        if changed:
+            logger.debug(
+                f"Updated {len(changed)} groups ({len(rebuild)} re-computed) in {(time.perf_counter() - start) * 1000:.1f}ms"
+            )
+        return changed
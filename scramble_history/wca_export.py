@@ -1,47 +1,226 @@
+import os
+import re
+import json
 import shutil
-import tempfile
 import zipfile
 import csv
 from typing import (
     cast,
     NamedTuple,
     TypeVar,
+    TYPE_CHECKING,
 )
-from collections.abc import Iterator
+from collections.abc import Iterator, Iterable
 from dataclasses import dataclass
 from collections import defaultdict
 from pathlib import Path
-from functools import lru_cache
+from functools import lru_cache, cached_property
 
-import requests
 import platformdirs
 
 from .log import logger
 
+if TYPE_CHECKING:
+    import requests
+
 
 def cachedir() -> Path:
     return Path(platformdirs.user_cache_dir("wca_export"))
 
 
+# the files from the export which are used, the rest of the archive is ignored
+RESULTS_TSV = "WCA_export_Results.tsv"
+SCRAMBLES_TSV = "WCA_export_Scrambles.tsv"
+COMPETITIONS_TSV = "WCA_export_Competitions.tsv"
+EXPORT_FILES = (RESULTS_TSV, SCRAMBLES_TSV, COMPETITIONS_TSV)
+
+
+class _IncompleteDownload(Exception):
+    pass
+
+
+def _read_json(path: Path) -> dict[str, str]:
+    if not path.exists():
+        return {}
+    try:
+        data = json.loads(path.read_text())
+    except ValueError:
+        return {}
+    return cast(dict[str, str], data) if isinstance(data, dict) else {}
+
+
+def _dir_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+class Snapshot(NamedTuple):
+    name: str
+    path: Path
+    size: int
+    current: bool
+
+
 class ExportDownloader:
-    def __init__(self) -> None:
-        self.cache_dir = cachedir()
+    """
+    Each export is extracted into its own directory under 'snapshots',
+    and the 'current' file has the name of the one in use. That is only
+    changed once a new export is completely extracted, so readers
+    never see a partially updated export
+
+    After an update, old snapshots are removed, keeping the last
+    'keep_snapshots' and (if set) keeping them under 'max_bytes' in total.
+    The current snapshot is never removed
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path | None = None,
+        export_data_url: str = "https://www.worldcubeassociation.org/api/v0/export/public",
+        timeout: float = 60,
+        retries: int = 3,
+        keep_snapshots: int = 1,
+        max_bytes: int | None = None,
+    ) -> None:
+        self.cache_dir = cache_dir or cachedir()
         if not self.cache_dir.exists():
             self.cache_dir.mkdir(parents=True)
-        self.cache_tsv_dir = self.cache_dir / "tsv"
+        self.snapshots_dir = self.cache_dir / "snapshots"
+        self.keep_snapshots = keep_snapshots
+        self.max_bytes = max_bytes
         self.database_name = "Scores"
-        self.export_data_url = (
-            "https://www.worldcubeassociation.org/api/v0/export/public"
-        )
+        self.export_data_url = export_data_url
+        self.timeout = timeout
+        if retries < 1:
+            raise ValueError(f"retries should be at least 1, got {retries}")
+        self.retries = retries
+
+    @cached_property
+    def session(self) -> "requests.Session":
+        # requests is slow to import, and isn't needed to read the cache
+        import requests
+
+        # re-uses connections to the server across requests
+        return requests.Session()
 
     @lru_cache(maxsize=1)
     def export_links(self) -> dict[str, str]:
-        req = requests.get(self.export_data_url)
+        req = self.session.get(self.export_data_url, timeout=self.timeout)
         req.raise_for_status()
         data = req.json()
         assert isinstance(data, dict)
         return cast(dict[str, str], data)
 
+    @property
+    def current_path(self) -> Path:
+        return self.cache_dir / "current"
+
+    @property
+    def legacy_tsv_dir(self) -> Path:
+        # where the TSV files were extracted before snapshots
+        return self.cache_dir / "tsv"
+
+    def current_snapshot(self) -> str | None:
+        if self.current_path.exists():
+            return self.current_path.read_text().strip()
+        return None
+
+    @property
+    def cache_tsv_dir(self) -> Path:
+        current = self.current_snapshot()
+        if current is None:
+            return self.legacy_tsv_dir
+        return self.snapshots_dir / current
+
+    def _set_current(self, name: str) -> None:
+        tmp = self.current_path.with_suffix(".tmp")
+        tmp.write_text(name)
+        tmp.replace(self.current_path)
+
+    def _new_snapshot_name(self) -> str:
+        # export dates are ISO formatted, so these sort by date
+        name = re.sub(r"[^\w.-]", "-", self.export_links()["export_date"].strip())
+        candidate, n = name, 0
+        while (self.snapshots_dir / candidate).exists():
+            n += 1
+            candidate = f"{name}.{n}"
+        return candidate
+
+    def snapshots(self) -> list[Snapshot]:
+        """extracted exports, oldest first"""
+        current = self.current_snapshot()
+        snapshots = []
+        if self.snapshots_dir.exists():
+            for path in sorted(self.snapshots_dir.iterdir()):
+                if not path.is_dir() or path.suffix == ".tmp":
+                    continue
+                snapshots.append(
+                    Snapshot(
+                        name=path.name,
+                        path=path,
+                        size=_dir_size(path),
+                        current=path.name == current,
+                    )
+                )
+        return snapshots
+
+    def cache_size(self) -> int:
+        return _dir_size(self.cache_dir)
+
+    def prune(
+        self, keep_snapshots: int | None = None, max_bytes: int | None = None
+    ) -> list[Snapshot]:
+        """
+        remove old snapshots (and anything left over from interrupted updates),
+        returns the snapshots which were removed
+        """
+        keep = self.keep_snapshots if keep_snapshots is None else keep_snapshots
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        if self.snapshots_dir.exists():
+            for path in self.snapshots_dir.glob("*.tmp"):
+                shutil.rmtree(path)
+        if self.current_snapshot() is not None and self.legacy_tsv_dir.exists():
+            shutil.rmtree(self.legacy_tsv_dir)
+
+        snapshots = self.snapshots()
+        total = sum(s.size for s in snapshots)
+        removed: list[Snapshot] = []
+        for snap in snapshots:
+            if snap.current:
+                continue
+            if len(snapshots) - len(removed) <= keep and (
+                max_bytes is None or total <= max_bytes
+            ):
+                break
+            logger.info(f"Removing snapshot {snap.name} ({snap.size} bytes)")
+            shutil.rmtree(snap.path)
+            total -= snap.size
+            removed.append(snap)
+        return removed
+
+    @property
+    def index_path(self) -> Path:
+        return self.cache_dir / "index.sqlite"
+
+    def build_index(self) -> None:
+        from .wca_index import build_index
+
+        build_index(self.cache_tsv_dir, self.index_path)
+
+    def update_index(self) -> dict[str, set[str]]:
+        """
+        bring the index up to date with the TSV files, returns
+        the competitions which changed in each table
+        """
+        from .wca_index import update_index
+
+        return update_index(self.cache_tsv_dir, self.index_path)
+
+    def changed_competitions(self) -> dict[str, set[str]]:
+        """the competitions which changed in the last update"""
+        from .wca_index import changed_competitions
+
+        return changed_competitions(self.index_path)
+
     @property
     def export_date_path(self) -> Path:
         return self.cache_dir / "export_date.txt"
@@ -64,48 +243,286 @@ class ExportDownloader:
             return False
         return True
 
-    def download_export(self) -> None:
+    @property
+    def part_path(self) -> Path:
+        return self.cache_dir / "export.zip.part"
+
+    @property
+    def part_validators_path(self) -> Path:
+        # the ETag/Last-Modified of the export being downloaded into part_path
+        return self.cache_dir / "export.zip.part.json"
+
+    @property
+    def validators_path(self) -> Path:
+        # the ETag/Last-Modified of the export the TSV files are from
+        return self.cache_dir / "export_validators.json"
+
+    def download_export(self) -> bool:
+        """
+        download the export and extract the TSV files
+
+        returns False if the server says the export hasn't changed
+        since the TSV files were last downloaded
+
+        The export is downloaded into a .part file, so if the connection drops
+        the download is resumed (with a Range request) when retried, or the
+        next time this is run
+        """
         tsv_url = self.export_links()["tsv_url"]
         assert "WCA_export" in tsv_url
-        with tempfile.TemporaryDirectory() as td:
-            ptd = Path(td)
-            assert ptd.exists()
-            logger.info("Downloading TSV export...")
-            r = requests.get(tsv_url, stream=True)
-            assert (
-                r.status_code == 200
-            ), "Failed to create connection to download TSV export"
-            write_to = ptd / "export.zip"
-            with open(write_to, "wb") as f:
-                for chunk in r:
-                    f.write(chunk)
+        logger.info("Downloading TSV export...")
+        import requests
+
+        for attempt in range(1, self.retries + 1):
+            try:
+                validators = self._download_part(tsv_url)
+                break
+            except (
+                requests.exceptions.ConnectionError,
+                requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.Timeout,
+                _IncompleteDownload,
+            ) as e:
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"Download failed ({e}), resuming...")
+        if validators is None:
+            logger.info("Export has not changed since it was last downloaded")
+            return False
 
-            zip_extract_to = ptd / "archive"
+        name = self._new_snapshot_name()
+        extract_to = self.snapshots_dir / f"{name}.tmp"
+        if extract_to.exists():
+            shutil.rmtree(extract_to)
+        try:
+            # reading the files out of the zip checks their CRCs
+            extract_export_files(self.part_path, extract_to)
+        except zipfile.BadZipFile:
+            # can't resume a corrupt download, start over next time
+            self.part_path.unlink()
+            self.part_validators_path.unlink(missing_ok=True)
+            shutil.rmtree(extract_to, ignore_errors=True)
+            raise
+        extract_to.rename(self.snapshots_dir / name)
+        self._set_current(name)
+        self.part_path.unlink()
+        self.part_validators_path.replace(self.validators_path)
+        logger.info(f"Saved TSV export to {self.cache_tsv_dir}")
+        return True
 
-            with zipfile.ZipFile(write_to, "r") as zip_r:
-                zip_r.extractall(str(zip_extract_to))
+    def _download_part(self, tsv_url: str) -> dict[str, str] | None:
+        """
+        download (or finish downloading) the export into part_path, returns the
+        validators for the downloaded file, or None if it hasn't changed
+        """
+        # byte ranges don't make sense if the body is compressed
+        headers = {"Accept-Encoding": "identity"}
+
+        current = _read_json(self.validators_path)
+        if current.get("url") == tsv_url and all(
+            (self.cache_tsv_dir / name).exists() for name in EXPORT_FILES
+        ):
+            if "etag" in current:
+                headers["If-None-Match"] = current["etag"]
+            if "last_modified" in current:
+                headers["If-Modified-Since"] = current["last_modified"]
+
+        offset = 0
+        partial = _read_json(self.part_validators_path)
+        if self.part_path.exists() and partial.get("url") == tsv_url:
+            # only resume if the file on the server is the same one
+            validator = partial.get("etag") or partial.get("last_modified")
+            if validator is not None:
+                offset = self.part_path.stat().st_size
+                headers["Range"] = f"bytes={offset}-"
+                headers["If-Range"] = validator
+
+        with self.session.get(
+            tsv_url, headers=headers, stream=True, timeout=self.timeout
+        ) as r:
+            if r.status_code == 304:
+                return None
+            if r.status_code == 416:
+                # e.g. 'bytes */5000', already downloaded the whole file
+                if r.headers.get("Content-Range") == f"bytes */{offset}":
+                    return partial
+                # the partial download doesn't match the file, start over
+                self.part_path.unlink()
+                raise _IncompleteDownload(
+                    f"Range {headers.get('Range')} not satisfiable"
+                )
+            total: int | None = None
+            if r.status_code == 206:
+                # e.g. 'bytes 1000-4999/5000'
+                content_range = r.headers["Content-Range"]
+                start = int(content_range.split()[1].split("-")[0])
+                assert start == offset, f"Requested {offset}, got {content_range}"
+                length = content_range.rsplit("/", 1)[1]
+                total = None if length == "*" else int(length)
+                mode = "ab"
+                logger.info(f"Resuming download from {offset} bytes")
+            elif r.status_code == 200:
+                if "Content-Length" in r.headers:
+                    total = int(r.headers["Content-Length"])
+                mode = "wb"
+            else:
+                r.raise_for_status()
+                raise RuntimeError(f"Unexpected response {r.status_code} for {tsv_url}")
+
+            validators = {"url": tsv_url}
+            if "ETag" in r.headers:
+                validators["etag"] = r.headers["ETag"]
+            if "Last-Modified" in r.headers:
+                validators["last_modified"] = r.headers["Last-Modified"]
+            self.part_validators_path.write_text(json.dumps(validators))
+
+            # if the connection drops, the chunk being read is lost,
+            # so keep these small to resume as close as possible
+            with open(self.part_path, mode) as f:
+                for chunk in r.iter_content(chunk_size=1 << 16):
+                    f.write(chunk)
 
-            shutil.copytree(zip_extract_to, self.cache_tsv_dir, dirs_exist_ok=True)
-            logger.info(f"Saved TSV export to {self.cache_tsv_dir}")
+        size = self.part_path.stat().st_size
+        if total is not None and size != total:
+            raise _IncompleteDownload(f"Downloaded {size} bytes, expected {total}")
+        return validators
 
     def download_if_out_of_date(self) -> None:
+        from .wca_index import index_usable
+
         if self.export_out_of_date():
             self.download_export()
+            # even if the export didn't change, a previous update may have
+            # been interrupted before the index was updated
+            self.update_index()
             self.update_date()
+            self.prune()
         else:
             logger.info("Export is already up to date")
+            if not index_usable(self.index_path):
+                self.build_index()
+
+
+def extract_export_files(zip_path: Path, tsv_dir: Path) -> None:
+    """
+    copy the EXPORT_FILES out of the zip into tsv_dir, without extracting
+    anything else. Each is decompressed to a temporary file and then
+    moved into place, so an interrupted update doesn't leave partial files
+    """
+    tsv_dir.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(zip_path, "r") as zip_r:
+        members = {Path(info.filename).name: info for info in zip_r.infolist()}
+        for name in EXPORT_FILES:
+            if name not in members:
+                raise RuntimeError(f"Could not find {name} in {zip_path}")
+        for name in EXPORT_FILES:
+            tmp = tsv_dir / f"{name}.tmp"
+            with zip_r.open(members[name]) as src, open(tmp, "wb") as dst:
+                shutil.copyfileobj(src, dst, length=1 << 20)
+            tmp.replace(tsv_dir / name)
 
 
 TSV = list[str]
 
 
-def _extract_records(wca_user_id: str, results_file: str) -> Iterator[TSV]:
-    with open(results_file, newline="") as f:
-        reader = csv.reader(f, delimiter="\t")
-        next(reader)
-        for line in reader:
-            if line[7] == wca_user_id:
-                yield line
+# files smaller than this are scanned in the main process
+PARALLEL_SCAN_MIN_BYTES = 64 * 1024 * 1024
+# how much of the file to read at a time when scanning
+SCAN_BLOCK_BYTES = 8 * 1024 * 1024
+
+
+def _scan_ranges(path: Path, parts: int) -> list[tuple[int, int]]:
+    """
+    split the file (after the header) into about 'parts'
+    byte ranges, each of which starts/ends on a line boundary
+    """
+    size = path.stat().st_size
+    with open(path, "rb") as f:
+        f.readline()
+        start = f.tell()
+        bounds = [start]
+        for i in range(1, parts):
+            pos = start + (size - start) * i // parts
+            if pos <= bounds[-1]:
+                continue
+            f.seek(pos - 1)
+            # if pos is the start of a line this reads just the previous newline
+            f.readline()
+            if f.tell() >= size:
+                break
+            if f.tell() > bounds[-1]:
+                bounds.append(f.tell())
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def _scan_range(path: Path, start: int, end: int, wca_user_ids: set[str]) -> list[TSV]:
+    """
+    find rows in [start, end) for the user IDs. Only lines which
+    contain one of the IDs somewhere are parsed as TSV
+    """
+    pattern = re.compile(b"|".join(re.escape(i.encode()) for i in sorted(wca_user_ids)))
+    found: list[TSV] = []
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start
+        leftover = b""
+        while remaining > 0 or leftover:
+            block = f.read(min(SCAN_BLOCK_BYTES, remaining)) if remaining > 0 else b""
+            # if the file was truncated, stop at the end
+            remaining = remaining - len(block) if block else 0
+            data = leftover + block
+            if remaining > 0:
+                # only process complete lines, carry the rest to the next block
+                cut = data.rfind(b"\n") + 1
+                data, leftover = data[:cut], data[cut:]
+            else:
+                leftover = b""
+            last_line = -1
+            for m in pattern.finditer(data):
+                line_start = data.rfind(b"\n", 0, m.start()) + 1
+                if line_start == last_line:
+                    continue
+                last_line = line_start
+                line_end = data.find(b"\n", m.end())
+                line = data[line_start : len(data) if line_end == -1 else line_end]
+                row = next(csv.reader([line.decode("utf-8")], delimiter="\t"))
+                if len(row) > 7 and row[7] in wca_user_ids:
+                    found.append(row)
+    return found
+
+
+def _extract_records(
+    wca_user_ids: set[str], results_file: str, jobs: int | None = None
+) -> Iterator[TSV]:
+    """
+    find the rows for these users in the results file, in file order
+
+    large files are split into chunks which are scanned in parallel
+    by 'jobs' processes (defaults to the number of CPUs)
+    """
+    if len(wca_user_ids) == 0:
+        return
+    path = Path(results_file)
+    jobs = jobs or os.cpu_count() or 1
+    if jobs <= 1 or path.stat().st_size < PARALLEL_SCAN_MIN_BYTES:
+        for start, end in _scan_ranges(path, 1):
+            yield from _scan_range(path, start, end, wca_user_ids)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    # more ranges than processes, so one slow range doesn't hold everything up
+    ranges = _scan_ranges(path, jobs * 4)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for rows in executor.map(
+            _scan_range,
+            [path] * len(ranges),
+            [r[0] for r in ranges],
+            [r[1] for r in ranges],
+            [wca_user_ids] * len(ranges),
+        ):
+            yield from rows
 
 
 T = TypeVar("T")
@@ -174,21 +591,37 @@ def _extract_scrambles_for_competitions(
                 yield line
 
 
+# the competition/event/round a result or scramble is from
+RoundKey = tuple[str, str, str]
+
+
+def _group_scrambles(
+    scrambles: list[WCA_Scramble],
+) -> dict[RoundKey, list[WCA_Scramble]]:
+    # group scrambles by round, keeping the order from the export
+    round_scrambles: dict[RoundKey, list[WCA_Scramble]] = defaultdict(list)
+    for scramble in scrambles:
+        round_scrambles[
+            (scramble.competitionId, scramble.eventId, scramble.roundTypeId)
+        ].append(scramble)
+    return round_scrambles
+
+
 def _match_records_and_scrambles(
-    records: list[WCA_Result], scrambles: list[WCA_Scramble]
+    records: list[WCA_Result],
+    scrambles: list[WCA_Scramble] | dict[RoundKey, list[WCA_Scramble]],
 ) -> Iterator[tuple[WCA_Result, list[WCA_Scramble]]]:
-    results_scramble_map: dict[WCA_Result, list[WCA_Scramble]] = defaultdict(list)
+    round_scrambles = (
+        scrambles if isinstance(scrambles, dict) else _group_scrambles(scrambles)
+    )
     for record in records:
-        for scramble in scrambles:
-            if (
-                record.competitionId == scramble.competitionId
-                and record.eventId == scramble.eventId
-                and record.roundTypeId == scramble.roundTypeId
-            ):
-                results_scramble_map[record].append(scramble)
-        if len(results_scramble_map) == 0:
+        matched = round_scrambles.get(
+            (record.competitionId, record.eventId, record.roundTypeId)
+        )
+        if not matched:
             logger.warning(f"Could not find any scrambles for {record}")
-    yield from results_scramble_map.items()
+            continue
+        yield record, list(matched)
 
 
 class WCA_Competition(NamedTuple):
@@ -234,29 +667,83 @@ class Details:
 
 
 def parse_return_all_details(wca_user_id: str) -> Details:
+    return parse_details([wca_user_id])[wca_user_id]
+
+
+def parse_details(wca_user_ids: Iterable[str]) -> dict[str, Details]:
+    """
+    extract the details for each WCA ID, reading each table
+    from the export once no matter how many IDs are passed
+    """
+    from .wca_index import index_usable
+
+    ids = list(dict.fromkeys(wca_user_ids))
     exp = ExportDownloader()
-    src = exp.cache_tsv_dir
+    if not index_usable(exp.index_path):
+        logger.info("No index found, scanning TSV files (run update to create one)")
+        return _details_from_tsv(exp.cache_tsv_dir, ids)
+
+    return _details_from_index(exp.index_path, ids)
+
+
+def _split_details(
+    wca_user_ids: list[str],
+    records: list[WCA_Result],
+    scrambles: list[WCA_Scramble],
+    competitions: list[WCA_Competition],
+) -> dict[str, Details]:
+    """
+    given the rows for every person, split them into the details for each one
+    """
+    person_records: dict[str, list[WCA_Result]] = {i: [] for i in wca_user_ids}
+    for r in records:
+        person_records[r.personId].append(r)
+    round_scrambles = _group_scrambles(scrambles)
+    details = {}
+    for person, recs in person_records.items():
+        attended = {r.competitionId for r in recs}
+        details[person] = Details(
+            competition_data=[c for c in competitions if c.id in attended],
+            # TODO: need to find the group that user was in to match to their scrambles?
+            results_w_scrambles=list(
+                _match_records_and_scrambles(recs, round_scrambles)
+            ),
+        )
+    return details
+
+
+def _details_from_index(
+    index_path: Path, wca_user_ids: list[str]
+) -> dict[str, Details]:
+    from .wca_index import WCAIndex
+
+    with WCAIndex(index_path) as index:
+        records = index.results(wca_user_ids)
+        competitions = {r.competitionId for r in records}
+        return _split_details(
+            wca_user_ids,
+            records,
+            index.scrambles(competitions),
+            index.competitions(competitions),
+        )
+
+
+def _details_from_tsv(src: Path, wca_user_ids: list[str]) -> dict[str, Details]:
     records = [
         WCA_Result.parse(row)
-        for row in _extract_records(wca_user_id, str(src / "WCA_export_Results.tsv"))
+        for row in _extract_records(set(wca_user_ids), str(src / RESULTS_TSV))
     ]
-    # all competitions user has been to
+    # all competitions any user has been to
     competitions = {r.competitionId for r in records}
-    # all scrambles from any competition user has been to
+    # all scrambles from any competition any user has been to
     comp_scrambles = [
         WCA_Scramble.parse(scr)
         for scr in _extract_scrambles_for_competitions(
-            str(src / "WCA_export_Scrambles.tsv"), competitions
+            str(src / SCRAMBLES_TSV), competitions
         )
     ]
-    # match records/scrambles
-    # TODO: need to find the group that user was in to match to their scrambles?
-    results_w_scrambles = list(_match_records_and_scrambles(records, comp_scrambles))
     comp_data = [
         WCA_Competition.parse(c)
-        for c in _competition_data(
-            str(src / "WCA_export_Competitions.tsv"), competitions
-        )
+        for c in _competition_data(str(src / COMPETITIONS_TSV), competitions)
     ]
-
-    return Details(competition_data=comp_data, results_w_scrambles=results_w_scrambles)
+    return _split_details(wca_user_ids, records, comp_scrambles, comp_data)
@@ -0,0 +1,358 @@
+"""
+A SQLite copy of the WCA TSV export, indexed on the columns
+used to extract a competitor's results, so that doesn't
+require scanning the (very large) TSV files every time
+
+Each table is partitioned by competition, and a hash of each partition
+is saved. When a new export is downloaded, only the rows for
+competitions which were added/changed/removed are re-written, and
+those competitions are recorded (see changed_competitions)
+"""
+
+import csv
+import hashlib
+import sqlite3
+from pathlib import Path
+from typing import NamedTuple, TypeVar
+from collections.abc import Iterator, Iterable
+
+from .log import logger
+from .wca_export import (
+    WCA_Result,
+    WCA_Scramble,
+    WCA_Competition,
+    row_to_type,
+    RESULTS_TSV,
+    SCRAMBLES_TSV,
+    COMPETITIONS_TSV,
+)
+
+T = TypeVar("T", bound=NamedTuple)
+
+# bump if the schema changes, so the index is rebuilt
+INDEX_VERSION = 2
+
+# table name -> TSV file it is built from
+TABLE_FILES = {
+    "results": RESULTS_TSV,
+    "scrambles": SCRAMBLES_TSV,
+    "competitions": COMPETITIONS_TSV,
+}
+
+INDEXES = {
+    "results": ("personId", "competitionId"),
+    "scrambles": ("competitionId",),
+    "competitions": ("id",),
+}
+
+# the column each table is partitioned by
+PARTITION_COLUMNS = {
+    "results": "competitionId",
+    "scrambles": "competitionId",
+    "competitions": "id",
+}
+
+TABLE_TYPES: dict[str, type[NamedTuple]] = {
+    "results": WCA_Result,
+    "scrambles": WCA_Scramble,
+    "competitions": WCA_Competition,
+}
+
+
+class Partition(NamedTuple):
+    # hash of the rows for one competition, in order
+    hash: str
+    # line number (in the TSV, not counting the header) of its first row
+    first_line: int
+    row_count: int
+    # whether all of its rows are next to each other
+    contiguous: bool
+
+
+class _PartitionHasher:
+    def __init__(self, first_line: int) -> None:
+        self.hash = hashlib.blake2b(digest_size=16)
+        self.first_line = first_line
+        self.last_line = first_line
+        self.count = 0
+
+    def add(self, line: int, row: list[str]) -> None:
+        self.hash.update(("\t".join(row) + "\n").encode())
+        self.last_line = line
+        self.count += 1
+
+    def partition(self) -> Partition:
+        return Partition(
+            hash=self.hash.hexdigest(),
+            first_line=self.first_line,
+            row_count=self.count,
+            contiguous=self.last_line - self.first_line + 1 == self.count,
+        )
+
+
+def _read_rows(path: Path) -> Iterator[tuple[int, list[str]]]:
+    """yields the line number and each row from the TSV file, after the header"""
+    with open(path, newline="") as f:
+        reader = csv.reader(f, delimiter="\t")
+        next(reader)
+        yield from enumerate(reader)
+
+
+class _Partitioner:
+    """hashes the rows in a table for each competition"""
+
+    def __init__(self, table: str) -> None:
+        self.col = TABLE_TYPES[table]._fields.index(PARTITION_COLUMNS[table])
+        self.hashers: dict[str, _PartitionHasher] = {}
+
+    def add(self, line: int, row: list[str]) -> str:
+        """add a row, returns the competition it is from"""
+        key = row[self.col] if len(row) > self.col else ""
+        hasher = self.hashers.get(key)
+        if hasher is None:
+            hasher = self.hashers[key] = _PartitionHasher(line)
+        hasher.add(line, row)
+        return key
+
+    def partitions(self) -> dict[str, Partition]:
+        return {k: h.partition() for k, h in self.hashers.items()}
+
+
+def _insert_sql(table: str) -> str:
+    cols = TABLE_TYPES[table]._fields + ("line",)
+    return (
+        f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})"
+    )
+
+
+def _insert_rows(
+    conn: sqlite3.Connection,
+    table: str,
+    path: Path,
+    partitions: set[str] | None = None,
+) -> dict[str, Partition]:
+    """
+    insert the rows from path, only for the given partitions if passed,
+    returns the partitions for every row in the file
+    """
+    nt = TABLE_TYPES[table]
+    partitioner = _Partitioner(table)
+
+    def rows() -> Iterator[tuple[str | int, ...]]:
+        for line, row in _read_rows(path):
+            key = partitioner.add(line, row)
+            if partitions is None or key in partitions:
+                yield tuple(row_to_type(row, nt)) + (line,)
+
+    conn.executemany(_insert_sql(table), rows())
+    return partitioner.partitions()
+
+
+def _create_tables(conn: sqlite3.Connection) -> None:
+    for table, nt in TABLE_TYPES.items():
+        cols = nt._fields + ("line INTEGER",)
+        conn.execute(f"CREATE TABLE {table} ({', '.join(cols)})")
+    conn.execute(
+        "CREATE TABLE partitions (tbl TEXT, competitionId TEXT, hash TEXT, first_line INTEGER, row_count INTEGER, contiguous INTEGER, PRIMARY KEY (tbl, competitionId))"
+    )
+    # the competitions which changed in the last update
+    conn.execute("CREATE TABLE changes (tbl TEXT, competitionId TEXT)")
+
+
+def _save_partitions(
+    conn: sqlite3.Connection, table: str, partitions: dict[str, Partition]
+) -> None:
+    conn.execute("DELETE FROM partitions WHERE tbl = ?", (table,))
+    conn.executemany(
+        "INSERT INTO partitions VALUES (?, ?, ?, ?, ?, ?)",
+        ((table, k) + tuple(p) for k, p in partitions.items()),
+    )
+
+
+def _load_partitions(conn: sqlite3.Connection, table: str) -> dict[str, Partition]:
+    return {
+        key: Partition(hash, first_line, row_count, bool(contiguous))
+        for key, hash, first_line, row_count, contiguous in conn.execute(
+            "SELECT competitionId, hash, first_line, row_count, contiguous FROM partitions WHERE tbl = ?",
+            (table,),
+        )
+    }
+
+
+def _scan_partitions(table: str, path: Path) -> dict[str, Partition]:
+    partitioner = _Partitioner(table)
+    for line, row in _read_rows(path):
+        partitioner.add(line, row)
+    return partitioner.partitions()
+
+
+def build_index(tsv_dir: Path, index_path: Path) -> None:
+    """
+    create the SQLite database at index_path from the TSV files in tsv_dir
+
+    this is written to a temporary file and then moved, so a
+    partially built index is never used
+    """
+    tmp = index_path.with_suffix(".tmp")
+    if tmp.exists():
+        tmp.unlink()
+    logger.info(f"Building index from {tsv_dir}...")
+    conn = sqlite3.connect(tmp)
+    try:
+        # this is a throwaway build, no need to be crash-safe
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        _create_tables(conn)
+        for table in TABLE_TYPES:
+            partitions = _insert_rows(conn, table, tsv_dir / TABLE_FILES[table])
+            _save_partitions(conn, table, partitions)
+            # everything is new
+            conn.executemany(
+                "INSERT INTO changes VALUES (?, ?)", ((table, k) for k in partitions)
+            )
+            for col in INDEXES[table]:
+                conn.execute(f"CREATE INDEX {table}_{col} ON {table} ({col})")
+        conn.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+        conn.commit()
+    finally:
+        conn.close()
+    tmp.replace(index_path)
+    logger.info(f"Saved index to {index_path}")
+
+
+def update_index(tsv_dir: Path, index_path: Path) -> dict[str, set[str]]:
+    """
+    update the index from the TSV files, only re-writing the rows for
+    competitions which were added, removed or changed since it was built.
+    If there is no usable index, this builds one from scratch
+
+    returns the changed competitions for each table
+    """
+    if not index_usable(index_path):
+        build_index(tsv_dir, index_path)
+        return changed_competitions(index_path)
+
+    logger.info(f"Updating index from {tsv_dir}...")
+    conn = sqlite3.connect(index_path)
+    changed: dict[str, set[str]] = {}
+    try:
+        # everything below happens in one transaction
+        with conn:
+            conn.execute("DELETE FROM changes")
+            for table in TABLE_TYPES:
+                path = tsv_dir / TABLE_FILES[table]
+                partition_col = PARTITION_COLUMNS[table]
+                old = _load_partitions(conn, table)
+                new = _scan_partitions(table, path)
+                changed[table] = {
+                    k
+                    for k in old.keys() | new.keys()
+                    if k not in old or k not in new or old[k].hash != new[k].hash
+                }
+
+                # unchanged partitions may still have moved in the file, if
+                # both are contiguous the line numbers are shifted. Otherwise
+                # rows after the first could have moved even if the first didn't,
+                # so the rows are re-written to keep the same order as the file
+                rewrite = set(changed[table])
+                for k in old.keys() & new.keys():
+                    if k in rewrite:
+                        continue
+                    if not (old[k].contiguous and new[k].contiguous):
+                        rewrite.add(k)
+                    elif old[k].first_line != new[k].first_line:
+                        conn.execute(
+                            f"UPDATE {table} SET line = line + ? WHERE {partition_col} = ?",
+                            (new[k].first_line - old[k].first_line, k),
+                        )
+
+                conn.executemany(
+                    f"DELETE FROM {table} WHERE {partition_col} = ?",
+                    ((k,) for k in rewrite),
+                )
+                if rewrite & new.keys():
+                    _insert_rows(conn, table, path, partitions=rewrite & new.keys())
+                _save_partitions(conn, table, new)
+                conn.executemany(
+                    "INSERT INTO changes VALUES (?, ?)",
+                    ((table, k) for k in changed[table]),
+                )
+                logger.info(
+                    f"{table}: {len(changed[table])} competitions changed, re-wrote {len(rewrite)}"
+                )
+    finally:
+        conn.close()
+    return changed
+
+
+def index_usable(index_path: Path) -> bool:
+    if not index_path.exists():
+        return False
+    conn = sqlite3.connect(f"file:{index_path}?mode=ro", uri=True)
+    try:
+        (version,) = conn.execute("PRAGMA user_version").fetchone()
+    except sqlite3.DatabaseError as e:
+        # e.g. truncated or corrupt, it's rebuilt
+        logger.warning(f"Could not read index at {index_path}: {e}")
+        return False
+    finally:
+        conn.close()
+    return bool(version == INDEX_VERSION)
+
+
+def changed_competitions(index_path: Path) -> dict[str, set[str]]:
+    """
+    the competitions which were added, removed or changed in each
+    table the last time the index was built/updated
+    """
+    conn = sqlite3.connect(f"file:{index_path}?mode=ro", uri=True)
+    try:
+        changed: dict[str, set[str]] = {table: set() for table in TABLE_TYPES}
+        for table, key in conn.execute("SELECT tbl, competitionId FROM changes"):
+            changed[table].add(key)
+        return changed
+    finally:
+        conn.close()
+
+
+class WCAIndex:
+    """
+    Look up rows from the export. Rows are returned in the same
+    order as they are in the TSV files
+    """
+
+    def __init__(self, index_path: Path) -> None:
+        self.conn = sqlite3.connect(f"file:{index_path}?mode=ro", uri=True)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "WCAIndex":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def _select(
+        self, table: str, column: str, values: Iterable[str], nt: type[T]
+    ) -> list[T]:
+        vals = list(values)
+        if len(vals) == 0:
+            return []
+        # sqlite has a limit on the number of parameters, so use a temporary table
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS lookup (value TEXT)")
+        self.conn.execute("DELETE FROM lookup")
+        self.conn.executemany("INSERT INTO lookup VALUES (?)", ((v,) for v in vals))
+        rows = self.conn.execute(
+            f"SELECT {', '.join(nt._fields)} FROM {table} WHERE {column} IN (SELECT value FROM lookup) ORDER BY line"
+        )
+        return [nt(*row) for row in rows]
+
+    def results(self, person_ids: Iterable[str]) -> list[WCA_Result]:
+        return self._select("results", "personId", person_ids, WCA_Result)
+
+    def scrambles(self, competitions: Iterable[str]) -> list[WCA_Scramble]:
+        return self._select("scrambles", "competitionId", competitions, WCA_Scramble)
+
+    def competitions(self, competitions: Iterable[str]) -> list[WCA_Competition]:
+        return self._select("competitions", "id", competitions, WCA_Competition)
@@ -0,0 +1,48 @@
+import random
+import datetime
+from typing import Callable
+
+import pytest
+
+from scramble_history.models import Solve, State
+
+
+def _random_solves(
+    n: int,
+    *,
+    seed: int = 0,
+    times_ms: tuple[int, int] = (10000, 20000),
+    dnf_chance: float = 0.1,
+    plus_two_chance: float = 0.1,
+) -> list[Solve]:
+    rand = random.Random(seed)
+    start = datetime.datetime(2022, 11, 3, tzinfo=datetime.timezone.utc)
+    solves = []
+    for i in range(n):
+        t = rand.randint(*times_ms)
+        penalty = 2000 if rand.random() < plus_two_chance else 0
+        solves.append(
+            Solve(
+                puzzle=rand.choice(["333", "222"]),
+                event_code="WCA",
+                event_description=rand.choice(["3x3", "3x3 OH", "2x2"]),
+                state=State.DNF if rand.random() < dnf_chance else State.SOLVED,
+                scramble=f"R U R' U' {i}",
+                comment=rand.choice(["", "pb", None]),
+                time_ms=t,
+                penalty_ms=penalty,
+                full_time_ms=t + penalty,
+                # in order, one roughly every second
+                when=start
+                + datetime.timedelta(seconds=i, milliseconds=rand.randint(0, 999)),
+            )
+        )
+    return solves
+
+
+@pytest.fixture
+def random_solves() -> Callable[..., list[Solve]]:
+    """
+    returns a function which creates 'n' random solves, the same ones for each 'seed'
+    """
+    return _random_solves
@@ -0,0 +1,66 @@
+import os
+import json
+import datetime
+from pathlib import Path
+
+from scramble_history.models import Solve, State
+from scramble_history.cache import MergeCache, encode_solves, decode_solves
+
+solves = [
+    Solve(
+        puzzle="333",
+        event_code="WCA",
+        event_description="3x3 CFOP",
+        state=State.SOLVED,
+        scramble="R' U2 D2 R F L2 F2 D F U2 L2 D R2 U' F2 D B2 L2 U2 L2",
+        comment="",
+        time_ms=18412,
+        penalty_ms=2000,
+        full_time_ms=20412,
+        when=datetime.datetime(2022, 11, 3, 6, 30, 1, tzinfo=datetime.timezone.utc),
+    ),
+    Solve(
+        puzzle="333",
+        event_code="WCA",
+        event_description="3x3 OH",
+        state=State.DNF,
+        scramble="B R2 D2 R2 F2 U' F2 D B2 D2 B2 U' B L F R2 B U2 B2 D2",
+        comment=None,
+        time_ms=15254,
+        penalty_ms=0,
+        full_time_ms=15254,
+        when=datetime.datetime(2022, 11, 3, 6, 36, 39, tzinfo=datetime.timezone.utc),
+    ),
+]
+
+
+def test_encode_roundtrip() -> None:
+    assert decode_solves(encode_solves(solves)) == solves
+
+
+def test_merge_cache(tmp_path: Path) -> None:
+    sourcemap = tmp_path / "sourcemap.json"
+    sourcemap.write_text("[]")
+    data = tmp_path / "data.txt"
+    data.write_text("solves")
+    cache = MergeCache(sourcemap, cache_dir=tmp_path / "cache")
+
+    assert cache.load("cstimer", data) is None
+    cache.store("cstimer", data, solves)
+    assert cache.load("cstimer", data) == solves
+    # entries are per parser
+    assert cache.load("twistytimer", data) is None
+
+    # same contents, different mtime is still a hit
+    st = data.stat()
+    os.utime(data, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert cache.load("cstimer", data) == solves
+
+    # changing the file invalidates the entry
+    data.write_text("more solves")
+    assert cache.load("cstimer", data) is None
+
+    # as does changing the sourcemap
+    cache.store("cstimer", data, solves)
+    sourcemap.write_text(json.dumps([{"changed": True}]))
+    assert cache.load("cstimer", data) is None
@@ -3,7 +3,9 @@ from decimal import Decimal
 
 import more_itertools
 
-from scramble_history.models import Solve, State
+import pytest
+
+from scramble_history.models import Solve, State, DNF_MS, to_ms
 from scramble_history.group_operations import Solve, grouped, run_operations
 from scramble_history.error import unwrap
 
@@ -14,9 +16,9 @@ dnf = Solve(
     state=State.DNF,
     scramble="B R2 D2 R2 F2 U' F2 D B2 D2 B2 U' B L F R2 B U2 B2 D2",
     comment="",
-    time=Decimal("15.254"),
-    penalty=Decimal("0"),
-    full_time=Decimal("15.254"),
+    time_ms=15254,
+    penalty_ms=0,
+    full_time_ms=15254,
     when=datetime.datetime(2022, 11, 3, 6, 36, 39, tzinfo=datetime.timezone.utc),
 )
 
@@ -28,9 +30,9 @@ solves = [
         state=State.SOLVED,
         scramble="R' U2 D2 R F L2 F2 D F U2 L2 D R2 U' F2 D B2 L2 U2 L2",
         comment="",
-        time=Decimal("21.966"),
-        full_time=Decimal("21.966"),
-        penalty=Decimal("0"),
+        time_ms=21966,
+        full_time_ms=21966,
+        penalty_ms=0,
         when=datetime.datetime(2022, 11, 3, 6, 37, 23, tzinfo=datetime.timezone.utc),
     ),
     Solve(
@@ -40,9 +42,9 @@ solves = [
         state=State.SOLVED,
         scramble="L U L B' L B2 R2 L B F2 U2 D R2 D L2 F2 L2 U' F2",
         comment="",
-        time=Decimal("15.788"),
-        full_time=Decimal("15.788"),
-        penalty=Decimal("0"),
+        time_ms=15788,
+        full_time_ms=15788,
+        penalty_ms=0,
         when=datetime.datetime(2022, 11, 3, 6, 38, 3, tzinfo=datetime.timezone.utc),
     ),
     Solve(
@@ -52,9 +54,9 @@ solves = [
         state=State.SOLVED,
         scramble="F2 D' B2 R2 F2 U R2 D2 U' L2 B2 D' F L2 B L' D2 R2 F' D' R'",
         comment="",
-        time=Decimal("23.533"),
-        full_time=Decimal("23.533"),
-        penalty=Decimal("0"),
+        time_ms=23533,
+        full_time_ms=23533,
+        penalty_ms=0,
         when=datetime.datetime(2022, 11, 3, 6, 38, 39, tzinfo=datetime.timezone.utc),
     ),
     Solve(
@@ -64,9 +66,9 @@ solves = [
         state=State.SOLVED,
         scramble="U2 L F' U2 F U' D' L R2 B2 D2 B' L2 F' L2 F2 D2 R2 D2 L",
         comment="",
-        time=Decimal("16.362"),
-        full_time=Decimal("18.362"),
-        penalty=Decimal("2"),
+        time_ms=16362,
+        full_time_ms=18362,
+        penalty_ms=2000,
         when=datetime.datetime(2022, 11, 3, 6, 39, 20, tzinfo=datetime.timezone.utc),
     ),
 ]
@@ -113,7 +115,7 @@ def test_average() -> None:
     g3 = unwrap(grouped(doubled, operation="average", count=5))
     assert g3.solve_count == 5
     assert len(g3.solves) == 5
-    assert g3.result == Decimal("20.764666666666666827723020105622708797454833984375")
+    assert g3.result == Decimal("20.76466666666666666666666667")
     assert g3.describe() == "Ao5: 20.765 = 21.966 21.966 (15.788) (23.533) 18.362"
 
     g4 = unwrap(grouped([dnf, *solves], operation="average", count=5))
@@ -152,7 +154,7 @@ def test_global_mean() -> None:
     g2 = unwrap(grouped(hundred_solves, operation="global_mean"))
     assert len(g2.solves) == 100
     assert g2.solve_count == 99
-    assert g2.result == Decimal("19.891505050505049467801654827781021595001220703125")
+    assert g2.result == Decimal("19.89150505050505050505050505")
 
     g3 = unwrap(grouped(hundred_solves, operation="global_mean", count=5))
     assert len(g3.solves) == 5
@@ -171,3 +173,14 @@ def test_global_mean() -> None:
 def test_run_operations() -> None:
     ops = run_operations(hundred_solves, operation="average", counts=[5, 12, 50, 100])
     assert ops == {5: "21.287", 12: "20.119", 50: "19.912", 100: "19.933"}
+
+
+def test_times_ms() -> None:
+    assert solves[-1].time == Decimal("16.362")
+    assert solves[-1].full_time == Decimal("18.362")
+    assert solves[-1].result_ms == 18362
+    assert dnf.result_ms == DNF_MS
+    assert to_ms(Decimal("15.254")) == 15254
+    assert to_ms(Decimal("2")) == 2000
+    with pytest.raises(ValueError):
+        to_ms(Decimal("15.2545"))
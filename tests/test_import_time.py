@@ -0,0 +1,47 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+# modules which are slow to import, and should only be imported
+# by the commands which use them
+HEAVY_MODULES = ["numpy", "requests", "IPython", "tabulate", "orjson", "simplejson"]
+
+# milliseconds. This depends on the machine (and what else is running), so
+# the timing test only runs if the budget is set, e.g. =100
+IMPORT_BUDGET_MS = os.environ.get("SCRAMBLE_HISTORY_IMPORT_BUDGET_MS")
+
+
+def test_cli_lazy_imports() -> None:
+    code = "import sys, scramble_history.__main__; print(' '.join(sys.modules))"
+    proc = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    loaded = {m.split(".")[0] for m in proc.stdout.split()}
+    assert loaded.isdisjoint(HEAVY_MODULES), loaded.intersection(HEAVY_MODULES)
+
+
+def _cli_import_us() -> int:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import scramble_history.__main__"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        _, cumulative, name = line.split("|")
+        if name.strip() == "scramble_history.__main__":
+            return int(cumulative)
+    raise AssertionError(f"scramble_history.__main__ not in {proc.stderr}")
+
+
+@pytest.mark.skipif(
+    IMPORT_BUDGET_MS is None, reason="set SCRAMBLE_HISTORY_IMPORT_BUDGET_MS to run"
+)
+def test_cli_import_time() -> None:
+    assert IMPORT_BUDGET_MS is not None
+    # best of a few runs, to ignore noise from other processes
+    ms = min(_cli_import_us() for _ in range(3)) / 1000
+    assert ms < int(IMPORT_BUDGET_MS), f"importing the CLI took {ms:.1f}ms"
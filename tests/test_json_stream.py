@@ -0,0 +1,84 @@
+import io
+import json
+from pathlib import Path
+
+from scramble_history.json_stream import ObjectReader
+from scramble_history.cstimer import iter_file, parse_file, denormalize
+
+tests_dir = Path(__file__).parent.absolute()
+cstimer_data = tests_dir / "cstimer_data.txt"
+
+
+def test_object_reader() -> None:
+    text = cstimer_data.read_text()
+    expected = json.loads(text)
+    for chunk_size in (1, 7, 64, 1 << 16):
+        reader = ObjectReader(io.StringIO(text), chunk_size=chunk_size)
+        data = {}
+        for key in reader.keys():
+            if key.startswith("session"):
+                data[key] = list(reader.array_items())
+            else:
+                data[key] = reader.value()
+        assert data == expected
+
+
+def test_object_reader_skip() -> None:
+    text = '{"a": [1, 2, {"b": [3]}], "num": 12345, "c": {"d": "}"}, "e": []}'
+    reader = ObjectReader(io.StringIO(text), chunk_size=2)
+    data = {}
+    for key in reader.keys():
+        if key in ("num", "e"):
+            data[key] = reader.value()
+    assert data == {"num": 12345, "e": []}
+
+    # brackets/quotes in strings, and items nested deeper than ARRAY_ITEMS matches
+    items = ['x]\\"[', [[[[[[1, "]"]]]]]], {"b": ["}"]}, True, None, -1.5e3]
+    text = json.dumps({"a": items * 50, "b": 1})
+    for chunk_size in (1, 7, 64):
+        reader = ObjectReader(io.StringIO(text), chunk_size=chunk_size)
+        assert [k for k in reader.keys() if k == "b" and reader.value()] == ["b"]
+
+
+def _loaded_order(path: Path) -> list[tuple[int, int]]:
+    # (session, timestamp) for each solve, in the order cstimer lists
+    # the sessions, like when the whole file was loaded with json.loads
+    data = json.loads(path.read_text())
+    sessions = json.loads(data["properties"]["sessionData"])
+    return [
+        (int(n), raw[-1])
+        for n in sessions
+        if f"session{n}" in data
+        for raw in data[f"session{n}"]
+    ]
+
+
+def test_iter_file(tmp_path: Path) -> None:
+    streamed = list(iter_file(cstimer_data))
+    assert len(streamed) == 23
+    assert streamed == list(denormalize(parse_file(cstimer_data)))
+    assert [(s.number, int(s.when.timestamp())) for s in streamed] == _loaded_order(
+        cstimer_data
+    )
+
+    # sessions in the file in a different order than sessionData,
+    # with the same solve in two of them
+    data = json.loads(cstimer_data.read_text())
+    sessions = [k for k in data if k.startswith("session")]
+    data["session9"] = [data[sessions[0]][0]]
+    props = data.pop("properties")
+    info = json.loads(props["sessionData"])
+    info = {"9": {"name": "dupes", "opt": {}}, **info}
+    props["sessionData"] = json.dumps(info)
+    reordered = {k: data[k] for k in reversed(list(data))}
+    reordered["properties"] = props
+    path = tmp_path / "cstimer.txt"
+    path.write_text(json.dumps(reordered))
+
+    streamed = list(iter_file(path))
+    assert [(s.number, int(s.when.timestamp())) for s in streamed] == _loaded_order(
+        path
+    )
+    # the duplicate from session 9 is first, since it's listed first
+    assert streamed[0].number == 9
+    assert streamed == list(denormalize(parse_file(path)))
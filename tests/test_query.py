@@ -0,0 +1,154 @@
+import json
+import random
+import datetime
+from collections.abc import Iterator
+from typing import Callable
+
+import pytest
+
+from scramble_history.models import Solve
+from scramble_history.query import (
+    parse_query,
+    run_query,
+    iter_query,
+    is_lazy,
+    SolveIndex,
+)
+
+QUERIES = [
+    ["puzzle==333"],
+    ["puzzle==333", "event_description==3x3 OH"],
+    ['event_description?=["3x3", "2x2"]', "comment==pb", "head:20"],
+    ["drop:5", "puzzle==222", "tail:7", "limit:3"],
+    ["event_description==3x3___head:12___ao12"],
+    ["puzzle==333", "tail:0"],
+    ["head:50", "best", "puzzle==222", "mo3", "dump"],
+    ["puzzle==444", "dump"],
+    ["since:2022-11-03T00:01:00+00:00", "puzzle==333"],
+    [
+        "between:2022-11-03T00:00:30+00:00,2022-11-03T00:02:00+00:00",
+        "event_description==2x2",
+        "ao5",
+    ],
+    ["puzzle==222", "until:2022-11-03T00:00:40+00:00", "head:50", "dump"],
+    ["since:2022-11-04T00:00:00+00:00"],
+]
+
+
+def _naive(solves: list[Solve], query: list[str]) -> object:
+    # the same as the query, one list at a time
+    returns = []
+    for token in "___".join(query).split("___"):
+        if "==" in token:
+            attr, val = token.split("==")
+            solves = [s for s in solves if getattr(s, attr) == val]
+        elif "?=" in token:
+            attr, vals = token.split("?=")
+            solves = [s for s in solves if getattr(s, attr) in json.loads(vals)]
+        elif token.startswith(("since:", "until:", "between:")):
+            cmd, arg = token.split(":", maxsplit=1)
+            start, end = arg.split(",") if cmd == "between" else (arg, arg)
+            if cmd != "until":
+                since = datetime.datetime.fromisoformat(start)
+                solves = [s for s in solves if s.when >= since]
+            if cmd != "since":
+                until = datetime.datetime.fromisoformat(end)
+                solves = [s for s in solves if s.when < until]
+        elif token.startswith("drop:"):
+            solves = solves[int(token[5:]) :]
+        elif token.startswith(("head:", "limit:")):
+            solves = solves[: int(token.split(":")[1])]
+        elif token.startswith("tail:"):
+            solves = solves[max(len(solves) - int(token[5:]), 0) :]
+        else:
+            (resp,) = run_query(solves, query=parse_query([token]))
+            returns.append(resp)
+    return tuple(returns) if returns else solves
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_run_query(query: list[str], random_solves: Callable[..., list[Solve]]) -> None:
+    solves = random_solves(300)
+    assert run_query(solves, query=parse_query(query)) == _naive(solves, query)
+    parsed = parse_query(query)
+    if is_lazy(parsed):
+        assert list(iter_query(iter(solves), parsed)) == _naive(solves, query)
+    index = SolveIndex(solves)
+    assert run_query(solves, query=parsed, index=index) == _naive(solves, query)
+
+
+def test_index_reused(random_solves: Callable[..., list[Solve]]) -> None:
+    solves = random_solves(300)
+    index = SolveIndex(solves)
+    query = parse_query(['event_description?=["3x3", "2x2"]', "puzzle==333"])
+    expected = run_query(solves, query=query)
+    assert run_query(solves, query=query, index=index) == expected
+    built = dict(index._indexes)
+    assert set(built) == {"event_description", "puzzle"}
+    assert run_query(solves, query=query, index=index) == expected
+    # not rebuilt for the second query
+    assert all(index._indexes[k] is v for k, v in built.items())
+    assert len(index.positions("puzzle", {"444"})) == 0
+
+
+def test_time_range_sorted(random_solves: Callable[..., list[Solve]]) -> None:
+    solves = random_solves(300)
+    query = [
+        "event_description==3x3",
+        "between:2022-11-03T00:01:00+00:00,2022-11-03T00:03:00+00:00",
+    ]
+    expected = _naive(solves, query)
+    for ordered, sign in ((solves, 1), (solves[::-1], -1)):
+        index = SolveIndex(ordered)
+        assert run_query(ordered, query=parse_query(query), index=index) == (
+            expected[::sign]
+        )
+        assert index.when_sorted
+        # the range is found by binary search on the sorted solves
+        (tr,) = parse_query(query[1:])
+        start, end = index.span(tr)
+        assert ordered[start:end] == _naive(ordered, query[1:])
+
+    shuffled = list(solves)
+    random.Random(0).shuffle(shuffled)
+    index = SolveIndex(shuffled)
+    assert run_query(shuffled, query=parse_query(query), index=index) == _naive(
+        shuffled, query
+    )
+    assert index.when_sorted is False
+
+
+def test_parse_time_range() -> None:
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    (tr,) = parse_query(["since:7d"])
+    assert tr.end is None and tr.start is not None
+    assert abs(now - datetime.timedelta(days=7) - tr.start).total_seconds() < 5
+
+    # dates are in local time, and the end of a range includes the whole day
+    (tr,) = parse_query(["between:2022-11-03,2022-11-03"])
+    assert tr.start == datetime.datetime(2022, 11, 3).astimezone()
+    assert tr.end == datetime.datetime(2022, 11, 4).astimezone()
+
+    for bad in ["since:yesterday", "between:2022-11-03", "between:1d,2d"]:
+        with pytest.raises(ValueError):
+            parse_query([bad])
+
+
+def test_iter_query_stops_early(random_solves: Callable[..., list[Solve]]) -> None:
+    solves = random_solves(1000)
+    consumed = 0
+
+    def source() -> Iterator[Solve]:
+        nonlocal consumed
+        for s in solves:
+            consumed += 1
+            yield s
+
+    res = list(iter_query(source(), parse_query(["puzzle==333", "head:5"])))
+    assert len(res) == 5
+    assert consumed == solves.index(res[-1]) + 1
+
+    with pytest.raises(ValueError):
+        iter_query(solves, parse_query(["ao5"]))
+    with pytest.raises(ValueError):
+        parse_query(["head:-1"])
@@ -0,0 +1,121 @@
+from decimal import Decimal
+from typing import Callable
+
+import pytest
+
+from scramble_history.models import Solve, State, Operation
+from scramble_history.group_operations import (
+    grouped,
+    find_best_group,
+    rolling_series,
+    batch_stats,
+    run_operations,
+    summarize,
+)
+from scramble_history.query import parse_query, run_query
+from scramble_history.timeformat import format_decimal
+from scramble_history.error import unwrap
+from scramble_history.watch import RunningSummary
+
+# small range of times so there are lots of ties
+TIED_MS = (15000, 15040)
+
+
+def _brute_force_best(
+    solves: list[Solve], operation: Operation, count: int
+) -> Decimal | None:
+    results = []
+    for i in range(len(solves) - count + 1):
+        g = grouped(solves[i:], operation=operation, count=count)
+        assert not isinstance(g, Exception)
+        if g.state == State.SOLVED:
+            results.append(g.result)
+    return min(results) if results else None
+
+
+def test_find_best_group_matches_brute_force(
+    random_solves: Callable[..., list[Solve]],
+) -> None:
+    for seed in range(5):
+        solves = random_solves(150, seed=seed, times_ms=TIED_MS)
+        for operation in ("average", "mean"):
+            counts = [3, 5, 12, 50] if operation == "average" else [1, 3, 5, 12]
+            best = find_best_group(solves, operation, counts)  # type: ignore[arg-type]
+            for c in counts:
+                expected = _brute_force_best(solves, operation, c)  # type: ignore[arg-type]
+                if expected is None:
+                    assert c not in best
+                else:
+                    assert best[c].result == expected
+                    assert best[c].solve_count == c
+                    assert len(best[c].solves) == c
+
+
+def test_find_best_group_all_dnf(random_solves: Callable[..., list[Solve]]) -> None:
+    solves = random_solves(10, seed=0, times_ms=TIED_MS, dnf_chance=1)
+    assert find_best_group(solves, "average", [5]) == {}
+
+
+def test_invalid_count(random_solves: Callable[..., list[Solve]]) -> None:
+    solves = random_solves(10, seed=0)
+    for operation, count in (("mean", 0), ("mean", -2), ("average", 2)):
+        with pytest.raises(ValueError):
+            rolling_series(solves, operation, count)  # type: ignore[arg-type]
+        with pytest.raises(ValueError):
+            find_best_group(solves, operation, [count])  # type: ignore[arg-type]
+    with pytest.raises(ValueError):
+        run_query(solves, query=parse_query(["rolling:mo0"]))
+
+
+def test_rolling_series(random_solves: Callable[..., list[Solve]]) -> None:
+    solves = random_solves(60, seed=1, times_ms=TIED_MS, dnf_chance=0.05)
+    for operation, count in (("average", 5), ("average", 12), ("mean", 3)):
+        series = rolling_series(solves, operation, count)  # type: ignore[arg-type]
+        assert len(series) == len(solves) - count + 1
+        for i, r in enumerate(series):
+            g = unwrap(grouped(solves[i:], operation=operation, count=count))  # type: ignore[arg-type]
+            if g.state == State.SOLVED:
+                assert r is not None
+                assert format_decimal(r) == format_decimal(g.result)
+            else:
+                assert r is None
+
+    assert rolling_series(solves[:4], "average", 5) == []
+
+
+def test_rolling_query(random_solves: Callable[..., list[Solve]]) -> None:
+    solves = random_solves(8, seed=2, times_ms=TIED_MS, dnf_chance=0)
+    (resp,) = run_query(solves, query=parse_query(["rolling:mo3"]))
+    assert isinstance(resp, str)
+    lines = resp.splitlines()
+    assert len(lines) == 6
+    assert lines[0] == unwrap(grouped(solves, operation="mean", count=3)).lhs
+
+
+def test_batch_stats(random_solves: Callable[..., list[Solve]]) -> None:
+    solves = random_solves(120, seed=3, times_ms=TIED_MS)
+    counts = [5, 12, 50, 100, 1000]
+    stats = batch_stats(solves, "average", counts)
+    assert list(stats) == counts
+    current = run_operations(solves, "average", counts)
+    for c in counts:
+        st = stats[c]
+        assert st.count_ == c
+        assert ("--" if st.current is None else st.current.lhs) == current[c]
+        expected = _brute_force_best(solves, "average", c) if c <= 120 else None
+        if expected is None:
+            assert st.best is None
+        else:
+            assert st.best is not None
+            assert st.best.result == expected
+
+
+def test_running_summary(random_solves: Callable[..., list[Solve]]) -> None:
+    counts = [5, 12, 50, 1000]
+    for seed in range(3):
+        solves = random_solves(150, seed=seed, times_ms=TIED_MS, dnf_chance=0.2)
+        running = RunningSummary(counts)
+        for i, s in enumerate(solves):
+            running.push(s)
+            if i % 37 == 0 or i == len(solves) - 1:
+                assert running.summary() == summarize(solves[i::-1], counts)
@@ -26,3 +26,51 @@ def test_basic():
 
     assert data[0].scramble_type is not None
     assert data[0].scramble_type.name == "3x3x3"
+
+
+def test_parse_ndjson() -> None:
+    import json
+    from click.testing import CliRunner
+    from scramble_history.__main__ import main, _serialize
+    from scramble_history.cstimer import iter_file
+
+    res = CliRunner().invoke(main, ["parse", "cstimer", "--ndjson", str(cstimer_data)])
+    assert res.exit_code == 0, res.output
+    lines = res.output.splitlines()
+    assert len(lines) == 23
+    assert [json.loads(line) for line in lines] == json.loads(
+        _serialize(list(iter_file(cstimer_data)))
+    )
+
+
+def test_serialize_times(tmp_path: Path) -> None:
+    import json
+    from scramble_history.__main__ import _serialize
+    from scramble_history.cstimer import iter_file
+    from scramble_history.source_merger import SourceMerger, SourceMap
+
+    # times are stored in milliseconds, but are shown in seconds
+    solve = next(iter_file(cstimer_data))
+    data = json.loads(_serialize(solve))
+    assert "solve_time_ms" not in data
+    assert data["solve_time"] == "0.904"
+    assert solve.solve_time_ms == 904
+
+    merged = SourceMerger(tmp_path / "sourcemap.json").transform(
+        solve, SourceMap("", {}, "333", "WCA", "3x3")
+    )
+    assert merged.time_ms == 904
+    data = json.loads(_serialize(merged))
+    assert list(data) == [
+        "puzzle",
+        "event_code",
+        "event_description",
+        "state",
+        "scramble",
+        "comment",
+        "time",
+        "penalty",
+        "full_time",
+        "when",
+    ]
+    assert data["full_time"] == "0.904"
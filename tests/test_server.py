@@ -0,0 +1,126 @@
+import os
+import json
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from scramble_history.source_merger import SourceMerger, SourceMap, merge, parse_file
+from scramble_history.cstimer import Solve as CstimerSolve
+from scramble_history.server import SolveStore, QueryHandler, _Request
+
+tests_dir = Path(__file__).parent.absolute()
+cstimer_data = tests_dir / "cstimer_data.txt"
+
+
+def _store(
+    tmp_path: Path, match: dict[str, Any] | None = None, cache: bool = False
+) -> SolveStore:
+    sourcemap_file = tmp_path / "sourcemap.json"
+    sourcemap_file.write_text(
+        SourceMerger.sourcemap_dumps(
+            [
+                SourceMap(
+                    source_class_name=f"{CstimerSolve.__module__}.{CstimerSolve.__name__}",
+                    source_fields_match=match or {},
+                    transformed_puzzle="333",
+                    transformed_event_code="WCA",
+                    transformed_event_description="3x3",
+                )
+            ]
+        )
+    )
+    copy = tmp_path / "cstimer.txt"
+    copy.write_text(cstimer_data.read_text())
+    return SolveStore(
+        sourcemap_file, {"cstimer": [copy]}, cache=cache, check_interval=0
+    )
+
+
+def test_query(tmp_path: Path) -> None:
+    store = _store(tmp_path)
+    store.refresh(force=True)
+    solves = list(merge(store.sourcemap_file, store.conf, sort=True))
+    assert store.solves == solves
+    handler = QueryHandler(store, serialize=json.dumps)
+
+    def get(path: str, **params: list[str]) -> tuple[int, object]:
+        return handler.handle(_Request(path=path, params=params))
+
+    assert get("/status")[1] == {
+        "solves": len(solves),
+        "files": 1,
+        "loaded_at": store.loaded_at,
+    }
+    assert get("/query", q=["tail:2"]) == (200, {"solves": solves[-2:]})
+    assert get("/query", q=["head:2"], reverse=["1"]) == (
+        200,
+        {"solves": solves[::-1][:2]},
+    )
+    code, data = get("/query", q=["ao5"])
+    assert code == 200 and isinstance(data, dict) and len(data["output"]) == 1
+
+    code, data = get("/stats", count=["5"])
+    assert code == 200 and isinstance(data, dict)
+    assert data["3x3"]["solve_count"] == len(solves)
+    assert list(data["3x3"]["averages"]) == ["Ao5"]
+
+    code, body = handler.respond("/query?q=unknown")
+    assert code == 400 and "unknown" in json.loads(body)["error"]
+    assert handler.respond("/missing")[0] == 404
+    code, body = handler.respond("/query?q=mo0")
+    assert code == 400 and "mo0" in json.loads(body)["error"]
+
+
+def test_unmatched_solves(tmp_path: Path) -> None:
+    # nothing matches, so this would prompt when merging interactively
+    store = _store(tmp_path, match={"name": "not a session"})
+    with pytest.warns(UserWarning, match="Did not parse any solves"):
+        store.refresh(force=True)
+    assert store.solves == []
+
+
+def test_unmatched_not_cached(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr("scramble_history.cache.cachedir", lambda: tmp_path / "cache")
+    # only some of the sessions match
+    store = _store(tmp_path, match={"name": 1}, cache=True)
+    store.refresh(force=True)
+    assert 0 < len(store.solves) < len(list(parse_file("cstimer", cstimer_data)))
+
+    prompted = []
+
+    def prompt_for_transform(self: SourceMerger, data: Any) -> SourceMap:
+        prompted.append(data)
+        sm = self.sourcemap[0]._replace(source_fields_match={})
+        self.sourcemap.append(sm)
+        self._index = None
+        return sm
+
+    monkeypatch.setattr(SourceMerger, "prompt_for_transform", prompt_for_transform)
+    # the partial result from serve wasn't cached, so this prompts for the rest
+    solves = list(merge(store.sourcemap_file, store.conf, cache=True))
+    assert len(prompted) == 1
+    assert len(solves) == len(list(parse_file("cstimer", cstimer_data)))
+
+
+def test_reload(tmp_path: Path) -> None:
+    store = _store(tmp_path)
+    store.refresh()
+    loaded_at = store.loaded_at
+    assert loaded_at is not None
+
+    # nothing changed, so this doesn't reload
+    store.refresh()
+    assert store.loaded_at == loaded_at
+
+    path = store.conf["cstimer"][0]
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    store.refresh()
+    assert store.loaded_at != loaded_at
+
+    # if reloading fails, the previous solves are kept
+    solves = store.solves
+    path.write_text("not json")
+    store.refresh()
+    assert store.solves == solves
@@ -0,0 +1,53 @@
+from typing import Callable
+
+import pytest
+
+from scramble_history.models import Solve
+from scramble_history.query import parse_query, run_query
+from scramble_history.group_operations import batch_stats, grouped
+from scramble_history.error import unwrap
+
+np = pytest.importorskip("numpy")
+
+from scramble_history.solve_table import SolveTable
+
+
+def test_round_trip(random_solves: Callable[..., list[Solve]]) -> None:
+    solves = random_solves(40)
+    table = SolveTable.from_solves(solves)
+    assert len(table) == len(solves)
+    assert table.to_solves() == solves
+    assert table[3] == solves[3]
+    assert table[5:9].to_solves() == solves[5:9]
+    assert table.sort_by_when(reverse=True).to_solves() == sorted(
+        solves, key=lambda s: s.when, reverse=True
+    )
+    grouped_table = table.group_by("event_description")
+    assert list(grouped_table) == ["2x2", "3x3", "3x3 OH"]
+    assert grouped_table["2x2"].to_solves() == [
+        s for s in solves if s.event_description == "2x2"
+    ]
+
+
+def test_query_and_stats(random_solves: Callable[..., list[Solve]]) -> None:
+    solves = random_solves(40)
+    table = SolveTable.from_solves(solves)
+    for q in (
+        ["puzzle==333", "drop:2", "limit:20"],
+        ['event_description?=["2x2", "4x4"]', "tail:5"],
+        ["event_description==3x3 OH", "head:12"],
+        ["between:2022-11-03T00:00:10+00:00,2022-11-03T00:00:30.090+00:00"],
+    ):
+        res = run_query(table, query=parse_query(q))
+        assert isinstance(res, SolveTable)
+        assert res.to_solves() == run_query(solves, query=parse_query(q))
+
+    assert run_query(table, query=parse_query(["puzzle==333", "ao5"])) == run_query(
+        solves, query=parse_query(["puzzle==333", "ao5"])
+    )
+    assert unwrap(grouped(table, operation="mean", count=4)) == unwrap(
+        grouped(solves, operation="mean", count=4)
+    )
+    assert batch_stats(table, "average", [5, 12]) == batch_stats(
+        solves, "average", [5, 12]
+    )
@@ -0,0 +1,85 @@
+from pathlib import Path
+from typing import NamedTuple, Any
+
+from scramble_history.source_merger import SourceMerger, SourceMap, merge
+from scramble_history.cstimer import Solve as CstimerSolve
+
+tests_dir = Path(__file__).parent.absolute()
+cstimer_data = tests_dir / "cstimer_data.txt"
+
+
+class Src(NamedTuple):
+    puzzle: str
+    category: Any
+
+
+class Other(NamedTuple):
+    puzzle: str
+
+
+def _sm(cls: type, fields: dict[str, Any], desc: str) -> SourceMap:
+    return SourceMap(
+        source_class_name=f"{cls.__module__}.{cls.__name__}",
+        source_fields_match=fields,
+        transformed_puzzle="333",
+        transformed_event_code="WCA",
+        transformed_event_description=desc,
+    )
+
+
+def test_match_sourcemap(tmp_path: Path) -> None:
+    sourcemap = [
+        _sm(Src, {"puzzle": "333", "category": "OH"}, "3x3 OH"),
+        _sm(Src, {"puzzle": "333"}, "3x3"),
+        _sm(Src, {"puzzle": "333", "category": "Normal"}, "never matched"),
+        _sm(Other, {"puzzle": "333", "missing": 1}, "missing field"),
+    ]
+    sourcemap_file = tmp_path / "sourcemap.json"
+    sourcemap_file.write_text(SourceMerger.sourcemap_dumps(sourcemap))
+    merger = SourceMerger(sourcemap_file)
+
+    def desc(solve: Any) -> str | None:
+        m = merger.match_sourcemap(solve)
+        return m.transformed_event_description if m else None
+
+    for _ in range(2):
+        # first entry in the sourcemap wins
+        assert desc(Src("333", "OH")) == "3x3 OH"
+        assert desc(Src("333", "Normal")) == "3x3"
+        assert desc(Src("222", "Normal")) is None
+        assert desc(Other("333")) is None
+        # unhashable values are still compared
+        assert desc(Src("333", ["OH"])) == "3x3"
+
+    # re-loading the sourcemap resets the memo
+    sourcemap.insert(0, _sm(Src, {"puzzle": "222"}, "2x2"))
+    sourcemap_file.write_text(SourceMerger.sourcemap_dumps(sourcemap))
+    merger.load()
+    assert desc(Src("222", "Normal")) == "2x2"
+
+
+def _merge_conf(tmp_path: Path) -> tuple[Path, dict[str, list[Path]]]:
+    # an entry with no fields matches every solve from that class
+    sourcemap_file = tmp_path / "sourcemap.json"
+    sourcemap_file.write_text(
+        SourceMerger.sourcemap_dumps([_sm(CstimerSolve, {}, "3x3")])
+    )
+    copy = tmp_path / "cstimer_copy.txt"
+    copy.write_text(cstimer_data.read_text())
+    return sourcemap_file, {"cstimer": [cstimer_data, copy]}
+
+
+def test_merge_jobs(tmp_path: Path) -> None:
+    sourcemap_file, conf = _merge_conf(tmp_path)
+    serial = list(merge(sourcemap_file, conf))
+    assert len(serial) > 0
+    assert list(merge(sourcemap_file, conf, jobs=2)) == serial
+
+
+def test_merge_sorted(tmp_path: Path) -> None:
+    sourcemap_file, conf = _merge_conf(tmp_path)
+    solves = list(merge(sourcemap_file, conf))
+    for reverse in (False, True):
+        assert list(merge(sourcemap_file, conf, sort=True, reverse=reverse)) == sorted(
+            solves, key=lambda s: s.when, reverse=reverse
+        )
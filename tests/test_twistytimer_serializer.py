@@ -1,7 +1,6 @@
 import os
 import tempfile
 import datetime
-from decimal import Decimal
 from pathlib import Path
 
 
@@ -26,8 +25,8 @@ def test_twistytimer_serializer():
             puzzle="333",
             category="2-GEN",
             scramble="U' R U' R U R2 U' R U R' U2 R' U R' U2 R' U2 R' U R' U2 R2 U' R' U2",
-            time=Decimal("8"),
-            penalty=Decimal("2"),
+            time_ms=8000,
+            penalty_ms=2000,
             dnf=False,
             when=datetime.datetime(2022, 10, 3, 2, 0, 22, tzinfo=datetime.timezone.utc),
             comment="",
@@ -36,8 +35,8 @@ def test_twistytimer_serializer():
             puzzle="333",
             category="Roux",
             scramble="D2 F2 L2 B2 U' L2 D2 F2 D B' R D' U2 L2 U2 F2 L' B2 L2 U",
-            time=Decimal("36.06"),
-            penalty=Decimal("0"),
+            time_ms=36060,
+            penalty_ms=0,
             dnf=False,
             when=datetime.datetime(
                 2022, 10, 18, 21, 50, 10, 202000, tzinfo=datetime.timezone.utc
@@ -48,8 +47,8 @@ def test_twistytimer_serializer():
             puzzle="333",
             category="Roux",
             scramble="R' B2 D2 R B2 R2 D2 B2 R' B F2 D' L F D' B2 L B2 U2 L2",
-            time=Decimal("37.76"),
-            penalty=Decimal("0"),
+            time_ms=37760,
+            penalty_ms=0,
             dnf=True,
             when=datetime.datetime(
                 2022, 10, 18, 21, 51, 21, 408000, tzinfo=datetime.timezone.utc
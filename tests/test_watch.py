@@ -0,0 +1,55 @@
+from pathlib import Path
+
+from scramble_history.source_merger import SourceMerger, SourceMap, merge
+from scramble_history.cstimer import Solve as CstimerSolve
+from scramble_history.group_operations import summarize
+from scramble_history.watch import WatchedMerge
+
+tests_dir = Path(__file__).parent.absolute()
+cstimer_data = tests_dir / "cstimer_data.txt"
+
+
+def test_watched_merge(tmp_path: Path) -> None:
+    sourcemap_file = tmp_path / "sourcemap.json"
+    sourcemap_file.write_text(
+        SourceMerger.sourcemap_dumps(
+            [
+                SourceMap(
+                    source_class_name=f"{CstimerSolve.__module__}.{CstimerSolve.__name__}",
+                    source_fields_match={},
+                    transformed_puzzle="333",
+                    transformed_event_code="WCA",
+                    transformed_event_description="3x3",
+                )
+            ]
+        )
+    )
+    copy = tmp_path / "cstimer.txt"
+    copy.write_text(cstimer_data.read_text())
+    conf = {"cstimer": [cstimer_data]}
+    counts = [5, 12]
+    watched = WatchedMerge(
+        sourcemap_file, lambda: conf, group_by="event_description", counts=counts
+    )
+
+    def check() -> None:
+        expected = list(merge(sourcemap_file, conf, sort=True, reverse=True))
+        assert watched.groups["3x3"].summary() == summarize(expected, counts)
+
+    assert watched.update() == {"3x3"}
+    check()
+    # nothing changed
+    assert watched.update() == set()
+
+    # every solve in the new file is a duplicate
+    conf = {"cstimer": [cstimer_data, copy]}
+    assert watched.update() == set()
+
+    # the solves from the copy are used instead
+    conf = {"cstimer": [copy]}
+    assert watched.update() == {"3x3"}
+    check()
+
+    conf = {}
+    assert watched.update() == {"3x3"}
+    assert watched.groups == {}
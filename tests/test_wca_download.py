@@ -0,0 +1,184 @@
+import io
+import json
+import zipfile
+import threading
+from pathlib import Path
+from typing import Any
+from collections.abc import Iterator
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from scramble_history.wca_export import ExportDownloader, EXPORT_FILES
+
+ETAG = '"export-1"'
+
+
+def _export_zip() -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_STORED) as z:
+        for name in EXPORT_FILES:
+            z.writestr(name, f"header\n{name}\n" * 2000)
+        z.writestr("README.md", "unused")
+    return buf.getvalue()
+
+
+class ExportServer(ThreadingHTTPServer):
+    zip_data: bytes
+    etag: str
+    export_date: str
+    # if set, close the connection after sending this many bytes of the zip
+    drop_after: int | None
+    requests: list[dict[str, str]]
+
+
+class Handler(BaseHTTPRequestHandler):
+    server: ExportServer
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        if self.path == "/api":
+            body = json.dumps(
+                {
+                    "export_date": self.server.export_date,
+                    "tsv_url": f"http://127.0.0.1:{self.server.server_port}/WCA_export.tsv.zip",
+                }
+            ).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.server.requests.append(dict(self.headers))
+        data = self.server.zip_data
+        if self.headers.get("If-None-Match") == self.server.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        start = 0
+        rng = self.headers.get("Range")
+        if rng is not None and self.headers.get("If-Range") == self.server.etag:
+            start = int(rng.removeprefix("bytes=").rstrip("-"))
+        if start > 0:
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}"
+            )
+        else:
+            self.send_response(200)
+        self.send_header("ETag", self.server.etag)
+        self.send_header("Content-Length", str(len(data) - start))
+        self.end_headers()
+        body = data[start:]
+        if self.server.drop_after is not None:
+            body = body[: self.server.drop_after]
+            self.server.drop_after = None
+            self.close_connection = True
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server() -> Iterator[ExportServer]:
+    srv = ExportServer(("127.0.0.1", 0), Handler)
+    srv.zip_data = _export_zip()
+    srv.etag = ETAG
+    srv.export_date = "2022-11-01"
+    srv.drop_after = None
+    srv.requests = []
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def _downloader(server: ExportServer, cache_dir: Path) -> ExportDownloader:
+    return ExportDownloader(
+        cache_dir=cache_dir,
+        export_data_url=f"http://127.0.0.1:{server.server_port}/api",
+        timeout=5,
+    )
+
+
+def _check_extracted(server: ExportServer, exp: ExportDownloader) -> None:
+    with zipfile.ZipFile(io.BytesIO(server.zip_data)) as z:
+        for name in EXPORT_FILES:
+            assert (exp.cache_tsv_dir / name).read_bytes() == z.read(name)
+    assert not exp.part_path.exists()
+
+
+def test_download_conditional(server: ExportServer, tmp_path: Path) -> None:
+    exp = _downloader(server, tmp_path)
+    assert exp.download_export() is True
+    _check_extracted(server, exp)
+    assert "If-None-Match" not in server.requests[-1]
+
+    # already have this export, so the server responds with a 304
+    assert _downloader(server, tmp_path).download_export() is False
+    assert server.requests[-1]["If-None-Match"] == ETAG
+
+
+def test_download_resume(server: ExportServer, tmp_path: Path) -> None:
+    server.drop_after = 100_000
+    exp = _downloader(server, tmp_path)
+    assert exp.download_export() is True
+    _check_extracted(server, exp)
+    assert len(server.requests) == 2
+    # resumes from the last complete chunk
+    assert server.requests[1]["Range"] == f"bytes={1 << 16}-"
+
+
+def test_download_corrupt(server: ExportServer, tmp_path: Path) -> None:
+    # flip a byte in one of the files, so its CRC doesn't match
+    data = bytearray(server.zip_data)
+    idx = data.index(b"header\n")
+    data[idx] = ord("H")
+    server.zip_data = bytes(data)
+    exp = _downloader(server, tmp_path)
+    with pytest.raises(zipfile.BadZipFile):
+        exp.download_export()
+    assert not exp.part_path.exists()
+    assert not (exp.cache_tsv_dir / EXPORT_FILES[0]).exists()
+
+
+def _new_export(server: ExportServer, n: int) -> None:
+    server.etag = f'"export-{n}"'
+    server.export_date = f"2022-11-{n:02d}"
+
+
+def test_snapshots(server: ExportServer, tmp_path: Path) -> None:
+    exp = _downloader(server, tmp_path)
+    exp.download_export()
+    assert exp.current_snapshot() == "2022-11-01"
+    first = exp.cache_tsv_dir
+    assert first == tmp_path / "snapshots" / "2022-11-01"
+
+    for n in (2, 3):
+        _new_export(server, n)
+        exp = _downloader(server, tmp_path)
+        assert exp.download_export() is True
+        _check_extracted(server, exp)
+    assert [s.name for s in exp.snapshots()] == [
+        "2022-11-01",
+        "2022-11-02",
+        "2022-11-03",
+    ]
+    assert [s.current for s in exp.snapshots()] == [False, False, True]
+
+    removed = exp.prune(keep_snapshots=2)
+    assert [s.name for s in removed] == ["2022-11-01"]
+    assert not first.exists()
+
+    # the current export is never removed, even if it's over the limit
+    removed = exp.prune(max_bytes=0)
+    assert [s.name for s in removed] == ["2022-11-02"]
+    assert [s.name for s in exp.snapshots()] == ["2022-11-03"]
+    _check_extracted(server, exp)
+
+
+def test_retries(tmp_path: Path) -> None:
+    with pytest.raises(ValueError):
+        ExportDownloader(cache_dir=tmp_path, retries=0)
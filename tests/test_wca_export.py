@@ -0,0 +1,149 @@
+import zipfile
+from pathlib import Path
+from typing import Any
+
+from scramble_history.wca_export import (
+    WCA_Result,
+    WCA_Scramble,
+    WCA_Competition,
+    EXPORT_FILES,
+    RESULTS_TSV,
+    SCRAMBLES_TSV,
+    COMPETITIONS_TSV,
+    extract_export_files,
+    _match_records_and_scrambles,
+    _extract_records,
+    _details_from_tsv,
+    _details_from_index,
+)
+from scramble_history.wca_index import build_index, index_usable
+
+
+def _result(comp: str, event: str, round_type: str) -> WCA_Result:
+    return WCA_Result.parse(
+        [comp, event, round_type, "1", "900", "1000", "Name", "2017ABCD01", "USA", "a"]
+    )
+
+
+def _scramble(n: int, comp: str, event: str, round_type: str) -> WCA_Scramble:
+    return WCA_Scramble.parse(
+        [str(n), comp, event, round_type, "A", "0", str(n), f"R U R' {n}"]
+    )
+
+
+def test_match_records_and_scrambles() -> None:
+    records = [
+        _result("Comp2022", "333", "1"),
+        _result("Comp2022", "333", "f"),
+        _result("Comp2022", "222", "f"),
+        _result("Other2023", "333", "1"),
+    ]
+    scrambles = [
+        _scramble(1, "Comp2022", "333", "1"),
+        _scramble(2, "Comp2022", "333", "f"),
+        _scramble(3, "Comp2022", "333", "1"),
+        _scramble(4, "Other2023", "333", "1"),
+        _scramble(5, "Other2023", "222", "1"),
+    ]
+    matched = {
+        (r.competitionId, r.eventId, r.roundTypeId): [int(s.scrambleId) for s in scr]
+        for r, scr in _match_records_and_scrambles(records, scrambles)
+    }
+    # results without any scrambles are skipped
+    assert matched == {
+        ("Comp2022", "333", "1"): [1, 3],
+        ("Comp2022", "333", "f"): [2],
+        ("Other2023", "333", "1"): [4],
+    }
+
+
+def _write_tsv(path: Path, header: list[str], rows: list[list[str]]) -> None:
+    path.write_text("".join("\t".join(r) + "\n" for r in [header] + rows))
+
+
+def _write_export(tsv_dir: Path) -> None:
+    results = [
+        list(_result(comp, ev, rnd))
+        for comp, ev, rnd in [
+            ("Comp2022", "333", "1"),
+            ("Comp2022", "222", "f"),
+            ("Other2023", "333", "1"),
+        ]
+    ]
+    results.insert(1, list(_result("Comp2022", "333", "1")._replace(personId="X")))
+    _write_tsv(tsv_dir / RESULTS_TSV, list(WCA_Result._fields), results)
+    scrambles = [
+        list(_scramble(1, "Comp2022", "333", "1")),
+        list(_scramble(2, "Comp2022", "222", "f")),
+        list(_scramble(3, "Unrelated2021", "333", "1")),
+        list(_scramble(4, "Comp2022", "333", "1")),
+    ]
+    _write_tsv(tsv_dir / SCRAMBLES_TSV, list(WCA_Scramble._fields), scrambles)
+    comps = [
+        [c] + [""] * (len(WCA_Competition._fields) - 1)
+        for c in ("Comp2022", "Unrelated2021", "Other2023")
+    ]
+    _write_tsv(tsv_dir / COMPETITIONS_TSV, list(WCA_Competition._fields), comps)
+
+
+def test_details_from_index(tmp_path: Path) -> None:
+    _write_export(tmp_path)
+    index_path = tmp_path / "index.sqlite"
+    build_index(tmp_path, index_path)
+    assert index_usable(index_path)
+
+    people = ["2017ABCD01", "X", "missing"]
+    from_tsv = _details_from_tsv(tmp_path, people)
+    assert list(from_tsv) == people
+    assert _details_from_index(index_path, people) == from_tsv
+    for person in people:
+        assert _details_from_tsv(tmp_path, [person]) == {person: from_tsv[person]}
+
+    details = from_tsv["2017ABCD01"]
+    assert [c.id for c in details.competition_data] == ["Comp2022", "Other2023"]
+    assert [len(s) for _, s in details.results_w_scrambles] == [2, 1]
+
+
+def test_extract_export_files(tmp_path: Path) -> None:
+    export = tmp_path / "export"
+    export.mkdir()
+    _write_export(export)
+    zip_path = tmp_path / "export.zip"
+    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as z:
+        for name in EXPORT_FILES:
+            z.write(export / name, arcname=name)
+        z.writestr("WCA_export_Persons.tsv", "unused")
+        z.writestr("README.md", "unused")
+
+    tsv_dir = tmp_path / "tsv"
+    extract_export_files(zip_path, tsv_dir)
+    assert sorted(p.name for p in tsv_dir.iterdir()) == sorted(EXPORT_FILES)
+    for name in EXPORT_FILES:
+        assert (tsv_dir / name).read_bytes() == (export / name).read_bytes()
+
+
+def test_extract_records_chunked(tmp_path: Path, monkeypatch: Any) -> None:
+    import scramble_history.wca_export as wca_export
+
+    people = [f"2010ABCD{i:02d}" for i in range(20)]
+    rows = [
+        list(
+            _result(f"Comp{i % 7}", "333", "1")._replace(
+                personId=people[i % 20],
+                # an ID which is part of another field shouldn't match
+                personName=people[(i + 1) % 20],
+            )
+        )
+        for i in range(500)
+    ]
+    results = tmp_path / RESULTS_TSV
+    _write_tsv(results, list(WCA_Result._fields), rows)
+
+    want = {"2010ABCD03", "2010ABCD11"}
+    expected = [r for r in rows if r[7] in want]
+    assert list(_extract_records(want, str(results), jobs=1)) == expected
+
+    # force small blocks/chunks, scanned by multiple processes
+    monkeypatch.setattr(wca_export, "PARALLEL_SCAN_MIN_BYTES", 0)
+    monkeypatch.setattr(wca_export, "SCAN_BLOCK_BYTES", 1000)
+    assert list(_extract_records(want, str(results), jobs=2)) == expected
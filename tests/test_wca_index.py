@@ -0,0 +1,133 @@
+import sqlite3
+from pathlib import Path
+
+from scramble_history.wca_export import (
+    WCA_Result,
+    WCA_Scramble,
+    WCA_Competition,
+    RESULTS_TSV,
+    SCRAMBLES_TSV,
+    COMPETITIONS_TSV,
+)
+from scramble_history.wca_index import (
+    build_index,
+    update_index,
+    changed_competitions,
+    index_usable,
+    TABLE_TYPES,
+)
+
+Export = dict[str, list[list[str]]]
+
+
+def _write(tsv_dir: Path, export: Export) -> None:
+    tsv_dir.mkdir(exist_ok=True)
+    for name, nt in [
+        (RESULTS_TSV, WCA_Result),
+        (SCRAMBLES_TSV, WCA_Scramble),
+        (COMPETITIONS_TSV, WCA_Competition),
+    ]:
+        rows = [list(nt._fields)] + export[name]
+        (tsv_dir / name).write_text("".join("\t".join(r) + "\n" for r in rows))
+
+
+def _result(comp: str, person: str, best: str = "900") -> list[str]:
+    return [comp, "333", "f", "1", best, "1000", "Name", person, "USA", "a"]
+
+
+def _scramble(comp: str, n: int) -> list[str]:
+    return [str(n), comp, "333", "f", "A", "0", str(n), "R U"]
+
+
+def _comp(comp: str) -> list[str]:
+    return [comp] + ["x"] * (len(WCA_Competition._fields) - 1)
+
+
+def _dump(index_path: Path) -> dict[str, list[tuple[str, ...]]]:
+    conn = sqlite3.connect(index_path)
+    try:
+        return {
+            table: list(conn.execute(f"SELECT * FROM {table} ORDER BY line"))
+            for table in TABLE_TYPES
+        }
+    finally:
+        conn.close()
+
+
+def test_update_index(tmp_path: Path) -> None:
+    comps = [f"Comp{i}" for i in range(6)]
+    old: Export = {
+        RESULTS_TSV: [_result(c, p) for c in comps for p in ("A", "B")],
+        SCRAMBLES_TSV: [_scramble(c, n) for c in comps for n in range(3)],
+        COMPETITIONS_TSV: [_comp(c) for c in comps],
+    }
+    _write(tmp_path / "old", old)
+    index_path = tmp_path / "index.sqlite"
+    build_index(tmp_path / "old", index_path)
+    assert changed_competitions(index_path)["results"] == set(comps)
+
+    new: Export = {k: [list(r) for r in v] for k, v in old.items()}
+    res = new[RESULTS_TSV]
+    # modify a result, which shifts nothing
+    res[res.index(_result("Comp1", "B"))] = _result("Comp1", "B", best="800")
+    # add a row in the middle, which shifts the line numbers of everything after
+    res.insert(5, _result("Comp2", "C"))
+    # remove a competition entirely
+    new[RESULTS_TSV] = res = [r for r in res if r[0] != "Comp4"]
+    # add a result for an old competition at the end, making it non-contiguous
+    res.append(_result("Comp0", "C"))
+    # and a new competition
+    res.append(_result("Comp9", "A"))
+    new[SCRAMBLES_TSV].append(_scramble("Comp9", 0))
+    new[COMPETITIONS_TSV].append(_comp("Comp9"))
+    _write(tmp_path / "new", new)
+
+    changed = update_index(tmp_path / "new", index_path)
+    assert changed == {
+        "results": {"Comp0", "Comp1", "Comp2", "Comp4", "Comp9"},
+        "scrambles": {"Comp9"},
+        "competitions": {"Comp9"},
+    }
+    assert changed_competitions(index_path) == changed
+
+    # should be the same as building it from scratch
+    fresh = tmp_path / "fresh.sqlite"
+    build_index(tmp_path / "new", fresh)
+    assert _dump(index_path) == _dump(fresh)
+
+    # nothing changed
+    assert update_index(tmp_path / "new", index_path) == {t: set() for t in TABLE_TYPES}
+    assert _dump(index_path) == _dump(fresh)
+
+    # a corrupt index is rebuilt
+    index_path.write_bytes(b"not a database" * 100)
+    assert not index_usable(index_path)
+    update_index(tmp_path / "new", index_path)
+    assert _dump(index_path) == _dump(fresh)
+
+
+def test_update_index_interleaved(tmp_path: Path) -> None:
+    # the rows for each competition aren't next to each other
+    old: Export = {
+        RESULTS_TSV: [
+            _result("X", "A"),
+            _result("Y", "A"),
+            _result("Y", "B"),
+            _result("X", "B"),
+        ],
+        SCRAMBLES_TSV: [],
+        COMPETITIONS_TSV: [_comp("X"), _comp("Y")],
+    }
+    _write(tmp_path / "old", old)
+    index_path = tmp_path / "index.sqlite"
+    build_index(tmp_path / "old", index_path)
+
+    # the first row for X doesn't move, but the last one does
+    new: Export = {k: [list(r) for r in v] for k, v in old.items()}
+    new[RESULTS_TSV].insert(2, _result("Y", "C"))
+    _write(tmp_path / "new", new)
+    assert update_index(tmp_path / "new", index_path)["results"] == {"Y"}
+
+    fresh = tmp_path / "fresh.sqlite"
+    build_index(tmp_path / "new", fresh)
+    assert _dump(index_path) == _dump(fresh)